@@ -1,13 +1,29 @@
 import numpy as np
 from datetime import datetime
-from utils.map_utils import get_route, get_crowd_data
-import copy
+from utils.map_utils import get_route, get_crowd_levels
+from utils import metrics
+from models.route import Route, VARIANT_FACTORS, FIRST_LINES, TRANSFER_LINES, STEP_TEMPLATES
+from database.preferences import get_preference_store
+from models.eta_calibration import get_eta_calibrator
+
+# Outcome values and probabilities for the simulated monitoring checks
+CONGESTION_DELAYS = ([0, 5, 10, 15], [0.6, 0.25, 0.1, 0.05])
+SAFETY_ISSUES = ([False, True], [0.8, 0.2])
+SERVICE_DELAYS = ([0, 3, 8], [0.7, 0.2, 0.1])
+
+NUM_ALTERNATIVES = 3
+
+# Minutes added per crowd level in Balanced scoring, by the user's crowd tolerance
+CROWD_WEIGHTS = {'avoid crowds': 2.0, 'moderate': 1.0, 'no preference': 0.0}
 
 class RouteAgent:
-    def __init__(self):
+    def __init__(self, rng=None):
         self.history = []
+        # Inject a seeded numpy Generator for reproducible simulations
+        self.rng = rng if rng is not None else np.random.default_rng()
     
-    def get_route_recommendations(self, origin, destination, transport_mode, priority):
+    @metrics.timed('stage_seconds', stage='plan')
+    def get_route_recommendations(self, origin, destination, transport_mode, priority, user_id=None):
         """Get AI-powered route recommendations"""
         # Get base route
         profile = self._get_profile(transport_mode)
@@ -16,27 +32,99 @@ class RouteAgent:
         if not base_route:
             return None
         
-        # Generate alternative routes (simulated)
+        with metrics.span('stage_seconds', stage='enhancement'):
+            # Draw the simulated values for all alternatives at once
+            draws = self._draw_route_values([origin] * NUM_ALTERNATIVES, self.rng)
+            routes = self._build_routes(base_route, origin, destination, draws, 0)
+        
+        with metrics.span('stage_seconds', stage='scoring'):
+            # Preferences come from the in-memory store, not a database read per request
+            preferences = get_preference_store().get(user_id) if user_id is not None else None
+            self._sort_routes(routes, priority, preferences)
+        
+        return routes
+    
+    def _build_routes(self, base_route, origin, destination, draws, offset):
+        """Primary route plus simulated alternatives, using draws[offset:offset + NUM_ALTERNATIVES]"""
         routes = []
+        # Convert the GeoJSON coordinates once and share the array between alternatives
+        base_coords = _route_coords(base_route)
         
         # Primary route (fastest)
-        primary_route = self._enhance_route_data(base_route, origin, destination, 0)
+        primary_route = self._enhance_route_data(base_route, origin, destination, 0, _row(draws, offset), base_coords)
         routes.append(primary_route)
         
         # Alternative routes (simulated)
-        for i in range(1, 3):
-            alt_route = self._create_alternative_route(base_route, origin, destination, i)
+        for i in range(1, NUM_ALTERNATIVES):
+            alt_route = self._create_alternative_route(
+                base_route, origin, destination, i, _row(draws, offset + i), base_coords
+            )
             routes.append(alt_route)
         
+        return routes
+    
+    def _sort_routes(self, routes, priority, preferences=None):
         # Sort based on priority
         if priority == "Least Crowded":
             routes.sort(key=lambda x: x['crowd_level'])
         elif priority == "Safest":
             routes.sort(key=lambda x: x['safety_score'])
+        elif priority == "Balanced" and preferences is not None:
+            routes.sort(key=self._balanced_score(preferences))
         else:  # Fastest or Balanced
             routes.sort(key=lambda x: x['duration'])
+    
+    def _balanced_score(self, preferences):
+        """Duration plus crowd and safety penalties weighted by the user's preferences"""
+        crowd_weight = CROWD_WEIGHTS.get(preferences.crowd_tolerance, 1.0)
+        safety_weight = preferences.safety_priority / 5
+        return lambda x: x['duration'] + crowd_weight * x['crowd_level'] + safety_weight * (10 - x['safety_score'])
+    
+    def _draw_route_values(self, origins, rng, hour=None):
+        """Draw every simulated per-route value for len(origins) routes in vectorized calls"""
+        n = len(origins)
+        if hour is None:
+            hour = datetime.now().hour
         
-        return routes
+        # Safety is better during the day
+        low, high = (7, 10) if 6 <= hour <= 20 else (4, 7)
+        
+        return {
+            'crowd_level': get_crowd_levels(origins, hour, rng),
+            'safety_score': rng.integers(low, high, size=n),
+            'first_line': rng.integers(FIRST_LINES.start, FIRST_LINES.stop, size=n),
+            'transfer_line': rng.integers(TRANSFER_LINES.start, TRANSFER_LINES.stop, size=n),
+        }
+    
+    def simulate_trips(self, od_pairs, transport_mode="Bus", priority="Balanced", seed=None, hour=None):
+        """Plan and monitor a batch of trips, drawing all random values in a few vectorized calls"""
+        # A seed replays the same scenario regardless of the agent's own generator.
+        # Each trip yields its sorted routes and the alerts for the chosen route (None if unroutable).
+        rng = np.random.default_rng(seed) if seed is not None else self.rng
+        profile = self._get_profile(transport_mode)
+        n = len(od_pairs)
+        
+        origins = [origin for origin, _ in od_pairs for _ in range(NUM_ALTERNATIVES)]
+        draws = self._draw_route_values(origins, rng, hour)
+        congestion = rng.choice(CONGESTION_DELAYS[0], size=n, p=CONGESTION_DELAYS[1])
+        safety_issues = rng.choice(SAFETY_ISSUES[0], size=n, p=SAFETY_ISSUES[1])
+        delays = rng.choice(SERVICE_DELAYS[0], size=n, p=SERVICE_DELAYS[1])
+        
+        trips = []
+        for t, (origin, destination) in enumerate(od_pairs):
+            base_route = get_route(origin, destination, profile)
+            if not base_route:
+                trips.append(None)
+                continue
+            
+            routes = self._build_routes(base_route, origin, destination, draws, t * NUM_ALTERNATIVES)
+            self._sort_routes(routes, priority)
+            trips.append({
+                'routes': routes,
+                'alerts': self._format_alerts(int(congestion[t]), bool(safety_issues[t]), int(delays[t]))
+            })
+        
+        return trips
     
     def _get_profile(self, transport_mode):
         """Get routing profile based on transport mode"""
@@ -49,8 +137,11 @@ class RouteAgent:
         else:  # Multi-modal
             return "driving-car"
     
-    def _enhance_route_data(self, route, origin, destination, variant):
+    def _enhance_route_data(self, route, origin, destination, variant, values=None, coords=None):
         """Enhance route data with AI predictions"""
+        if values is None:
+            values = _row(self._draw_route_values([origin], self.rng), 0)
+        
         # Calculate distance and duration
         if 'features' in route and len(route['features']) > 0:
             distance = route['features'][0]['properties']['segments'][0]['distance'] / 1000  # Convert to km
@@ -60,76 +151,59 @@ class RouteAgent:
             distance = 10.0
             duration = 30.0
         
+        if coords is None:
+            coords = _route_coords(route)
+        
+        # Prefer the median of measured trips for this origin/destination cell over the routing
+        # engine's estimate. Observations are stored as primary-route (variant 0) minutes.
+        eta_interval = None
+        estimate = get_eta_calibrator().estimate(coords[0], coords[-1]) if len(coords) else None
+        if estimate is not None:
+            duration = estimate.median
+        
         # Apply variant modifications
-        if variant == 1:
-            # Slightly longer but less crowded
-            duration *= 1.1
-            distance *= 1.05
-        elif variant == 2:
-            # Safer but longer
-            duration *= 1.2
-            distance *= 1.1
-        
-        # Get crowd data (simulated)
-        crowd_level = get_crowd_data(origin)  # Would be more sophisticated in real implementation
-        
-        # Calculate safety score (simulated)
-        hour = datetime.now().hour
-        if 6 <= hour <= 20:
-            safety_score = np.random.randint(7, 10)
-        else:
-            safety_score = np.random.randint(4, 7)
+        duration_factor, distance_factor = VARIANT_FACTORS.get(variant, (1.0, 1.0))
+        duration *= duration_factor
+        distance *= distance_factor
+        if estimate is not None:
+            eta_interval = (round(estimate.low * duration_factor, 1), round(estimate.high * duration_factor, 1))
+        
+        # Crowd data and safety score (simulated, drawn in _draw_route_values)
+        crowd_level = values['crowd_level']  # Would be more sophisticated in real implementation
+        safety_score = values['safety_score']
         
         # Add steps for directions (simulated)
         steps = [
-            f"Walk to {origin} station",
-            f"Take bus line {np.random.randint(1, 15)} towards city center",
-            f"Transfer at Central Station to bus line {np.random.randint(20, 35)}",
-            f"Get off at {destination} station",
-            "Walk to your destination"
+            template.format(origin=origin, destination=destination,
+                            first_line=values['first_line'], transfer_line=values['transfer_line'])
+            for template in STEP_TEMPLATES
         ]
         
-        # Ensure geometry exists
-        if 'features' in route and len(route['features']) > 0:
-            geometry = route['features'][0]['geometry']
-        else:
-            # Create a simple geometry as fallback
-            start_coords = [72.8777, 19.0760]  # Default coordinates
-            end_coords = [77.1025, 28.7041]    # Default coordinates
-            geometry = {
-                'type': 'LineString',
-                'coordinates': [start_coords, end_coords]
-            }
-        
-        return {
-            'origin': origin,
-            'destination': destination,
-            'distance': round(distance, 1),
-            'duration': round(duration, 1),
-            'crowd_level': crowd_level,
-            'safety_score': safety_score,
-            'geometry': geometry,
-            'steps': steps,
-            'variant': variant
-        }
+        return Route(
+            origin=origin,
+            destination=destination,
+            distance=round(distance, 1),
+            duration=round(duration, 1),
+            crowd_level=crowd_level,
+            safety_score=safety_score,
+            coords=coords,
+            steps=steps,
+            variant=variant,
+            eta_interval=eta_interval
+        )
     
-    def _create_alternative_route(self, base_route, origin, destination, variant):
+    def _create_alternative_route(self, base_route, origin, destination, variant, values=None, base_coords=None):
         """Create an alternative route (simulated)"""
         # In a real implementation, this would find actual alternative routes
         # For now, we'll just modify the base route slightly
+        if base_coords is None:
+            base_coords = _route_coords(base_route)
         
-        # Make a deep copy of the route
-        alt_route = copy.deepcopy(base_route)
+        # Copy only the coordinate array, then shift every 5th inner point
+        coords = base_coords.copy()
+        coords[5:-1:5] += 0.001 * variant
         
-        # Modify some coordinates slightly to simulate different route
-        if 'features' in alt_route and len(alt_route['features']) > 0:
-            coords = alt_route['features'][0]['geometry']['coordinates']
-            for i in range(1, len(coords)-1):
-                if i % 5 == 0:  # Modify every 5th point
-                    coords[i][0] += 0.001 * variant
-                    coords[i][1] += 0.001 * variant
-        
-        return self._enhance_route_data(alt_route, origin, destination, variant)
+        return self._enhance_route_data(base_route, origin, destination, variant, values, coords)
     
     def monitor_route(self, route):
         """Monitor a route for changes and provide alerts"""
@@ -142,6 +216,9 @@ class RouteAgent:
         # Check for delays
         delays = self._check_delays(route)
         
+        return self._format_alerts(congestion, safety_issues, delays)
+    
+    def _format_alerts(self, congestion, safety_issues, delays):
         alerts = []
         if congestion:
             alerts.append(("Congestion", f"High congestion detected on your route. Estimated delay: {congestion} minutes"))
@@ -157,14 +234,30 @@ class RouteAgent:
     def _check_congestion(self, route):
         """Check for congestion on the route (simulated)"""
         # In a real implementation, this would use real-time traffic data
-        return np.random.choice([0, 5, 10, 15], p=[0.6, 0.25, 0.1, 0.05])
+        return self.rng.choice(CONGESTION_DELAYS[0], p=CONGESTION_DELAYS[1])
     
     def _check_safety(self, route):
         """Check for safety issues on the route (simulated)"""
         # In a real implementation, this would use crime data, user reports, etc.
-        return np.random.choice([False, True], p=[0.8, 0.2])
+        return self.rng.choice(SAFETY_ISSUES[0], p=SAFETY_ISSUES[1])
     
     def _check_delays(self, route):
         """Check for delays on the route (simulated)"""
         # In a real implementation, this would use real-time transit data
-        return np.random.choice([0, 3, 8], p=[0.7, 0.2, 0.1])
+        return self.rng.choice(SERVICE_DELAYS[0], p=SERVICE_DELAYS[1])
+
+
+def _route_coords(route):
+    """(N, 2) coordinate array from an ORS GeoJSON route"""
+    # Ensure geometry exists
+    if 'features' in route and len(route['features']) > 0:
+        return np.asarray(route['features'][0]['geometry']['coordinates'], dtype=np.float64)
+    # Create a simple geometry as fallback
+    start_coords = [72.8777, 19.0760]  # Default coordinates
+    end_coords = [77.1025, 28.7041]    # Default coordinates
+    return np.array([start_coords, end_coords])
+
+
+def _row(draws, i):
+    """Values for route i from a dict of drawn arrays, as plain Python scalars"""
+    return {key: values[i].item() for key, values in draws.items()}
@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import os
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from agents.route_agent import RouteAgent
+from database.database import init_db, get_history
+from database.preferences import get_preference_store
+from utils import metrics
+
+# Headless JSON API around RouteAgent, for running the planner outside Streamlit.
+# Run with several worker processes, e.g.:
+#   uvicorn api.server:app --workers 4 --host 0.0.0.0 --port 8000
+
+MAX_BATCH_SIZE = 50
+
+agent = RouteAgent()
+
+# Planning blocks on upstream HTTP calls, so batch requests fan out over threads
+_batch_executor = ThreadPoolExecutor(max_workers=8)
+
+
+class PlanRequest(BaseModel):
+    origin: str
+    destination: str
+    transport_mode: str = "Bus"
+    priority: str = "Fastest"
+    user_id: Optional[int] = None
+
+
+class BatchPlanRequest(BaseModel):
+    requests: List[PlanRequest]
+
+
+class MonitorRequest(BaseModel):
+    route: dict
+
+
+class PreferencesRequest(BaseModel):
+    preferences: dict
+    user_id: Optional[int] = 1
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Each worker process makes sure the tables exist before serving
+    init_db()
+    if metrics.is_enabled() and metrics.DUMP_PATH:
+        metrics.start_json_dump(metrics.DUMP_PATH)
+    yield
+
+
+app = FastAPI(title="Smart Transit AI", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+
+def _plan(request):
+    return agent.get_route_recommendations(
+        request.origin, request.destination, request.transport_mode, request.priority, request.user_id
+    )
+
+
+def _serialize_routes(routes):
+    # Only valid inside an ORJSONResponse, which writes the coordinate arrays directly without
+    # building nested lists first. A plain returned dict would go through jsonable_encoder,
+    # which mangles numpy arrays.
+    return [route.to_dict(as_lists=False) for route in routes] if routes else routes
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text metrics for this worker (enable with SMART_TRANSIT_METRICS=1)"""
+    return metrics.render_prometheus()
+
+
+@app.post("/plan")
+def plan(request: PlanRequest):
+    """Get route recommendations for one journey"""
+    routes = _plan(request)
+    if not routes:
+        raise HTTPException(status_code=404, detail="Could not find routes for this journey")
+    return ORJSONResponse({"routes": _serialize_routes(routes)})
+
+
+@app.post("/plan/batch")
+def plan_batch(batch: BatchPlanRequest):
+    """Get route recommendations for several journeys at once"""
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} journeys per batch")
+    results = list(_batch_executor.map(_plan, batch.requests))
+    return ORJSONResponse({"results": [{"routes": _serialize_routes(routes)} for routes in results]})
+
+
+@app.post("/monitor")
+def monitor(request: MonitorRequest):
+    """Check a route for congestion, safety issues and delays"""
+    alerts = agent.monitor_route(request.route)
+    return {"alerts": [{"type": alert_type, "message": message} for alert_type, message in alerts]}
+
+
+@app.get("/history")
+def history(user_id: Optional[int] = None):
+    """Travel history, most recent first"""
+    rows = get_history(user_id)
+    return {
+        "history": [
+            {"id": row[0], "start": row[1], "end": row[2], "duration": row[3], "timestamp": row[4]}
+            for row in rows
+        ]
+    }
+
+
+@app.get("/preferences")
+def preferences(user_id: int = 1):
+    return {"user_id": user_id, "preferences": get_preference_store().get(user_id).to_dict()}
+
+
+@app.put("/preferences")
+def update_preferences(request: PreferencesRequest):
+    try:
+        saved = get_preference_store().save(request.user_id, request.preferences)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown user {request.user_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"user_id": request.user_id, "preferences": saved.to_dict()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "api.server:app",
+        host=os.environ.get("API_HOST", "127.0.0.1"),
+        port=int(os.environ.get("API_PORT", "8000")),
+        workers=int(os.environ.get("API_WORKERS", os.cpu_count() or 1)),
+    )
@@ -1,25 +1,13 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import folium
-from streamlit_folium import folium_static
 import time
-from datetime import datetime
-import sqlite3
-import requests
-from geopy.geocoders import Nominatim
-import plotly.express as px
+import streamlit as st
 from streamlit_option_menu import option_menu
-import json
-import os
 
 # Import custom modules
+# Heavy modules (pandas, plotly, folium, the routing stack, audio) are imported inside
+# the pages that use them, so pages like Settings and Help start without loading them
 try:
-    from utils.map_utils import get_route, get_route_with_waypoints, get_crowd_data, geocode_location
-    from utils.voice_utils import text_to_speech
-    from utils.alert_utils import send_alert
-    from agents.route_agent import RouteAgent
-    from database.database import init_db, save_route, get_history, get_user_preferences, save_user_preferences
+    from database.database import init_db, save_route, get_history, get_or_create_user, record_actual_time
+    from database.preferences import get_preference_store, UserPreferences
 except ImportError as e:
     st.error(f"Import error: {e}")
     st.info("Please make sure all module files are in the correct directories")
@@ -37,12 +25,59 @@ if 'current_route' not in st.session_state:
     st.session_state.current_route = None
 if 'selected_tab' not in st.session_state:
     st.session_state.selected_tab = "Route Planner"
+if 'route_results' not in st.session_state:
+    st.session_state.route_results = None
+if 'current_trip' not in st.session_state:
+    # (trip id, start time) of the selected route, for measuring the actual travel time
+    st.session_state.current_trip = None
+
+# Resource layer: one-time setup shared by every session and rerun
+@st.cache_resource(show_spinner=False)
+def setup_database():
+    """Create the database tables once per process"""
+    init_db()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def load_agent():
+    """Shared route agent for all sessions"""
+    from agents.route_agent import RouteAgent
+    return RouteAgent()
+
+@st.cache_data(show_spinner=False)
+def read_css(file_name):
+    with open(file_name) as f:
+        return f.read()
+
+# Memoized results, invalidated explicitly when the underlying data changes
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_route_recommendations(_agent, origin, destination, transport_mode, priority, user_id):
+    return _agent.get_route_recommendations(origin, destination, transport_mode, priority, user_id)
+
+@st.cache_data(show_spinner=False)
+def cached_history(user_id):
+    return get_history(user_id)
+
+@st.cache_data(show_spinner=False)
+def resolve_user(username):
+    return get_or_create_user(username)
+
+def record_route(origin, destination, route, user_id):
+    """Save a route to history and drop the memoized history; returns the trip id"""
+    trip_id = save_route(origin, destination, route, user_id)
+    cached_history.clear()
+    return trip_id
+
+def store_user_preferences(preferences, user_id):
+    """Save preferences; the preference store updates its in-memory copy"""
+    get_preference_store().save(user_id, preferences)
+    # Balanced recommendations depend on preferences
+    cached_route_recommendations.clear()
 
 # Custom CSS
 def local_css(file_name):
     try:
-        with open(file_name) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+        st.markdown(f'<style>{read_css(file_name)}</style>', unsafe_allow_html=True)
     except:
         st.markdown("""
         <style>
@@ -133,17 +168,10 @@ except:
 
 # Initialize database
 try:
-    init_db()
+    setup_database()
 except Exception as e:
     st.error(f"Database initialization error: {e}")
 
-# Initialize route agent
-try:
-    agent = RouteAgent()
-except Exception as e:
-    st.error(f"Agent initialization error: {e}")
-    agent = None
-
 # App title and description
 st.title("🚌 Smart AI Public Transport & Route Optimizer")
 st.markdown("""
@@ -159,6 +187,14 @@ with st.sidebar:
     except:
         st.markdown("### 🚌 Smart Transit AI")
     
+    # Every user gets their own history and preferences
+    username = st.text_input("Username", value="default_user").strip() or "default_user"
+    try:
+        user_id = resolve_user(username)
+    except Exception as e:
+        st.error(f"Error loading user: {e}")
+        user_id = 1
+    
     selected = option_menu(
         menu_title="Navigation",
         options=["Route Planner", "Live Tracking", "Travel History", "Settings", "Help"],
@@ -174,7 +210,11 @@ def display_route(route, index):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Estimated Time", f"{route['duration']} min")
+        interval = route['eta_interval']
+        st.metric(
+            "Estimated Time", f"{route['duration']} min",
+            help=f"Typically {interval[0]}-{interval[1]} min, based on past trips" if interval else None
+        )
     
     with col2:
         st.metric("Distance", f"{route['distance']} km")
@@ -183,41 +223,6 @@ def display_route(route, index):
         crowd_level = "Low" if route['crowd_level'] < 3 else "Medium" if route['crowd_level'] < 7 else "High"
         st.metric("Crowd Level", crowd_level)
     
-    # Display route on map
-    try:
-        start_coords = route['geometry']['coordinates'][0]
-        m = folium.Map(
-            location=[start_coords[1], start_coords[0]],
-            zoom_start=12
-        )
-        
-        # Add route to map
-        folium.PolyLine(
-            locations=[(coord[1], coord[0]) for coord in route['geometry']['coordinates']],
-            color='blue',
-            weight=5,
-            opacity=0.7,
-            popup=f"Route {index+1}"
-        ).add_to(m)
-        
-        # Add markers for start and end
-        folium.Marker(
-            [route['geometry']['coordinates'][0][1], route['geometry']['coordinates'][0][0]],
-            popup="Start",
-            icon=folium.Icon(color='green')
-        ).add_to(m)
-        
-        folium.Marker(
-            [route['geometry']['coordinates'][-1][1], route['geometry']['coordinates'][-1][0]],
-            popup="End",
-            icon=folium.Icon(color='red')
-        ).add_to(m)
-        
-        # Display map
-        folium_static(m, width=700, height=400)
-    except Exception as e:
-        st.error(f"Error displaying map: {e}")
-    
     # Step-by-step directions
     with st.expander("View Step-by-Step Directions"):
         for i, step in enumerate(route['steps']):
@@ -229,7 +234,8 @@ def display_route(route, index):
         st.success(f"Route {index+1} selected! Navigate to the Live Tracking tab to begin your journey.")
         # Save to history
         try:
-            save_route(origin, destination, route)
+            trip_id = record_route(origin, destination, route, user_id)
+            st.session_state.current_trip = (trip_id, time.time())
         except Exception as e:
             st.error(f"Error saving route: {e}")
 
@@ -237,6 +243,13 @@ def display_route(route, index):
 if selected == "Route Planner":
     st.header("📍 Plan Your Journey")
     
+    # Initialize route agent
+    try:
+        agent = load_agent()
+    except Exception as e:
+        st.error(f"Agent initialization error: {e}")
+        agent = None
+    
     # Input form
     col1, col2 = st.columns(2)
     with col1:
@@ -267,34 +280,51 @@ if selected == "Route Planner":
             else:
                 with st.spinner("Finding the best route for you..."):
                     # Get route recommendations
-                    routes = agent.get_route_recommendations(origin, destination, transport_mode, priority)
+                    routes = cached_route_recommendations(agent, origin, destination, transport_mode, priority, user_id)
+                    # Keep the results so they survive reruns triggered by the widgets below
+                    st.session_state.route_results = (origin, destination, routes)
                     
-                    if routes:
-                        # Display routes
-                        st.success("Found the best routes for your journey!")
-                        
-                        # Create tabs for different routes
-                        tab1, tab2, tab3 = st.tabs(["Recommended Route", "Alternative 1", "Alternative 2"])
-                        
-                        with tab1:
-                            display_route(routes[0], 0)
-                        
-                        with tab2:
-                            display_route(routes[1], 1)
-                        
-                        with tab3:
-                            display_route(routes[2], 2)
-                        
-                        # Voice guidance option
-                        if st.button("🔊 Get Voice Guidance", use_container_width=True):
-                            try:
-                                text_to_speech(f"Your route from {origin} to {destination} will take approximately {routes[0]['duration']} minutes.")
-                            except Exception as e:
-                                st.error(f"Voice guidance error: {e}")
-                    else:
+                    if not routes:
                         st.error("Could not find routes for your journey. Please check your locations and try again.")
         else:
             st.warning("Please enter both starting point and destination.")
+    
+    results = st.session_state.route_results
+    if results and results[2] and results[:2] == (origin, destination):
+        routes = results[2]
+        
+        # Display routes
+        st.success("Found the best routes for your journey!")
+        
+        # Display all routes on one map
+        try:
+            from streamlit_folium import st_folium
+            from utils.map_utils import build_route_map
+            
+            route_map = build_route_map(routes, selected_index=0)
+            st_folium(route_map, key="route_map", width=700, height=400, returned_objects=[])
+        except Exception as e:
+            st.error(f"Error displaying map: {e}")
+        
+        # Create tabs for different routes
+        tab1, tab2, tab3 = st.tabs(["Recommended Route", "Alternative 1", "Alternative 2"])
+        
+        with tab1:
+            display_route(routes[0], 0)
+        
+        with tab2:
+            display_route(routes[1], 1)
+        
+        with tab3:
+            display_route(routes[2], 2)
+        
+        # Voice guidance option
+        if st.button("🔊 Get Voice Guidance", use_container_width=True):
+            try:
+                from utils.voice_utils import text_to_speech
+                text_to_speech(f"Your route from {origin} to {destination} will take approximately {routes[0]['duration']} minutes.")
+            except Exception as e:
+                st.error(f"Voice guidance error: {e}")
 
 elif selected == "Live Tracking":
     st.header("📡 Live Tracking")
@@ -312,43 +342,34 @@ elif selected == "Live Tracking":
     # Get current position based on progress
     route = st.session_state.current_route
     try:
-        total_points = len(route['geometry']['coordinates'])
-        current_index = int((progress / 100) * (total_points - 1))
-        current_pos = route['geometry']['coordinates'][current_index]
+        import folium
+        from streamlit_folium import st_folium
+        from utils.map_utils import build_route_map
         
-        # Create map
-        m = folium.Map(location=[current_pos[1], current_pos[0]], zoom_start=13)
+        # Interpolate along the route by distance travelled
+        current_pos = route.position_at(progress / 100)
         
-        # Add route
-        folium.PolyLine(
-            locations=[(coord[1], coord[0]) for coord in route['geometry']['coordinates']],
-            color='blue',
-            weight=5,
-            opacity=0.7
-        ).add_to(m)
+        # The route layer stays the same between reruns; only the position layer changes,
+        # so the map component updates the marker instead of re-rendering the whole map
+        m = build_route_map([route], zoom_start=13)
         
         # Add current position marker
+        position = folium.FeatureGroup(name="Position")
         folium.Marker(
             [current_pos[1], current_pos[0]],
             popup="Your position",
             icon=folium.Icon(color='green', icon='user')
-        ).add_to(m)
-        
-        # Add start and end markers
-        folium.Marker(
-            [route['geometry']['coordinates'][0][1], route['geometry']['coordinates'][0][0]],
-            popup="Start",
-            icon=folium.Icon(color='green', icon='play')
-        ).add_to(m)
-        
-        folium.Marker(
-            [route['geometry']['coordinates'][-1][1], route['geometry']['coordinates'][-1][0]],
-            popup="End",
-            icon=folium.Icon(color='red', icon='stop')
-        ).add_to(m)
+        ).add_to(position)
         
         # Display map
-        folium_static(m, width=800, height=500)
+        st_folium(
+            m,
+            key="live_map",
+            width=800,
+            height=500,
+            feature_group_to_add=position,
+            returned_objects=[]
+        )
     except Exception as e:
         st.error(f"Error displaying live map: {e}")
     
@@ -365,11 +386,25 @@ elif selected == "Live Tracking":
     if progress > 70:
         st.info("🔄 You're 70% through your journey. Next stop in 5 minutes.")
     
+    # Measured trip times calibrate future ETAs for this journey
+    if st.session_state.current_trip is not None and st.button("✅ I've Arrived", use_container_width=True):
+        trip_id, started_at = st.session_state.current_trip
+        try:
+            record_actual_time(trip_id, round((time.time() - started_at) / 60, 1))
+            st.session_state.current_trip = None
+            st.success("Journey complete. Thanks, your travel time helps improve future estimates.")
+        except Exception as e:
+            st.error(f"Error saving travel time: {e}")
+    
     # SOS button
     if st.button("🆘 SOS Alert", type="secondary", use_container_width=True):
         try:
-            send_alert("SOS activated. User needs assistance.")
-            st.success("SOS alert sent to emergency contacts")
+            from utils.alert_utils import send_alert
+            alert = send_alert("SOS activated. User needs assistance.", alert_type="sos", user_id=user_id)
+            if alert['queued']:
+                st.success("SOS alert sent to emergency contacts")
+            else:
+                st.error("SOS alert could not be sent, the alert service is busy. Please try again or call emergency services.")
         except Exception as e:
             st.error(f"Error sending SOS: {e}")
 
@@ -378,7 +413,10 @@ elif selected == "Travel History":
     
     # Get user history
     try:
-        history = get_history()
+        import pandas as pd
+        import plotly.express as px
+        
+        history = cached_history(user_id)
         
         if history:
             # Convert to DataFrame for display
@@ -409,20 +447,10 @@ elif selected == "Settings":
     
     # Get current preferences
     try:
-        current_prefs = get_user_preferences()
+        current_prefs = get_preference_store().get(user_id).to_dict()
     except Exception as e:
         st.error(f"Error loading preferences: {e}")
-        current_prefs = {
-            'walking_speed': 'moderate',
-            'max_walking_time': 15,
-            'crowd_tolerance': 'moderate',
-            'safety_priority': 7,
-            'voice_guidance': True,
-            'congestion_alerts': True,
-            'delay_alerts': True,
-            'safety_alerts': True,
-            'emergency_contact': ''
-        }
+        current_prefs = UserPreferences().to_dict()
     
     # User preferences
     st.subheader("User Preferences")
@@ -446,7 +474,7 @@ elif selected == "Settings":
         crowd_tolerance = st.select_slider(
             "Crowd Tolerance",
             options=["Avoid Crowds", "Moderate", "No Preference"],
-            value=current_prefs.get('crowd_tolerance', 'Moderate').capitalize()
+            value=current_prefs.get('crowd_tolerance', 'Moderate').title()
         )
         
         safety_priority = st.slider(
@@ -485,7 +513,7 @@ elif selected == "Settings":
             'emergency_contact': emergency_contact
         }
         try:
-            save_user_preferences(preferences)
+            store_user_preferences(preferences, user_id)
             st.success("Preferences saved successfully!")
         except Exception as e:
             st.error(f"Error saving preferences: {e}")
@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.synthetic_city import FakeGeocoder, FakeORSClient
+
+# Local HTTP server speaking the parts of the Nominatim and ORS APIs the app uses,
+# backed by a SyntheticCity. Unlike the in-process stand-ins it exercises the real
+# geopy/openrouteservice clients, timeouts and error handling:
+#
+#   with FakeServices(SyntheticCity()) as services:
+#       map_utils.ORS_BASE_URL = map_utils.NOMINATIM_URL = services.url
+
+
+class FakeServices:
+    """Fake ORS/Nominatim server on a local port, optionally failing every request"""
+
+    def __init__(self, city, latency=0.0, host='127.0.0.1', port=0):
+        self.geocoder = FakeGeocoder(city, latency=latency)
+        self.ors = FakeORSClient(city, latency=latency)
+        # Set to an HTTP status (e.g. 503) to make every request fail with it
+        self.fail_status = None
+        self.requests = {'search': 0, 'directions': 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def search(self, query):
+        """Nominatim /search results for query"""
+        location = self.geocoder.geocode(query)
+        if location is None:
+            return []
+        return [{
+            'place_id': self.geocoder.city.station_index(query),
+            'lat': str(location.latitude),
+            'lon': str(location.longitude),
+            'display_name': query,
+        }]
+
+    def directions(self, profile, body):
+        """ORS /v2/directions/{profile}/geojson response for a request body"""
+        return self.ors.directions(body['coordinates'], profile=profile)
+
+
+def _make_handler(services):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != '/search':
+                self._send(404, {'error': 'not found'})
+                return
+            services._count('search')
+            if services.fail_status:
+                self._send(services.fail_status, {'error': 'unavailable'})
+                return
+            query = parse_qs(url.query).get('q', [''])[0]
+            self._send(200, services.search(query))
+
+        def do_POST(self):
+            parts = urlsplit(self.path).path.strip('/').split('/')
+            if len(parts) != 4 or parts[:2] != ['v2', 'directions']:
+                self._send(404, {'error': 'not found'})
+                return
+            services._count('directions')
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if services.fail_status:
+                self._send(services.fail_status, {'error': 'unavailable'})
+                return
+            self._send(200, services.directions(parts[2], body))
+
+    return Handler
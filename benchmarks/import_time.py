@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Cold-start check: imports the modules the app and the API load in fresh interpreters, and
+# fails if that takes longer than the budget or pulls in modules that should only
+# load on first use.
+#   python -m benchmarks.import_time --budget 2.0
+
+# Modules each entry point imports at startup, ending with the entry point itself
+# (importing app runs the Streamlit script once in bare mode)
+STARTUP_MODULES = {
+    'app': [
+        'streamlit',
+        'streamlit_option_menu',
+        'database.database',
+        'database.preferences',
+        'app',
+    ],
+    'api': [
+        'database.database',
+        'database.preferences',
+        'utils.map_utils',
+        'utils.alert_utils',
+        'utils.voice_utils',
+        'agents.route_agent',
+        'api.server',
+    ],
+}
+
+# Heavy modules that must not be loaded just by importing the startup modules
+LAZY_MODULES = ['torch', 'pygame', 'gtts', 'folium', 'plotly', 'pandas', 'openrouteservice', 'geopy']
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = '''
+import importlib, json, sys, tempfile, time, os
+timings = {}
+errors = {}
+start = time.perf_counter()
+for name in %r:
+    t = time.perf_counter()
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        errors[name] = f'{type(e).__name__}: {e}'
+        continue
+    timings[name] = time.perf_counter() - t
+    if name == 'database.database':
+        # Keep the app's startup writes out of transit.db
+        sys.modules[name].DB_PATH = os.path.join(tempfile.mkdtemp(), 'import_time.db')
+total = time.perf_counter() - start
+print(json.dumps({'total_s': total, 'modules_s': timings, 'import_errors': errors,
+                  'loaded_lazy_modules': [m for m in %r if m in sys.modules]}))
+'''
+
+
+def measure(modules, lazy_modules=LAZY_MODULES, runs=3):
+    """Best-of-N cold import time in fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE % (modules, lazy_modules)],
+            check=True, capture_output=True, text=True, cwd=REPO_ROOT
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(results, key=lambda result: result['total_s'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start import time")
+    parser.add_argument('--budget', type=float, default=2.0, help="maximum seconds to import each entry point")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    failures = []
+    report = {'budget_s': args.budget}
+    for entry_point, modules in STARTUP_MODULES.items():
+        result = measure(modules, runs=args.runs)
+        report[entry_point] = result
+        if result['import_errors']:
+            # A module that fails to import would otherwise look like a fast startup
+            failures.append(f"{entry_point}: could not import {', '.join(result['import_errors'])}")
+        if result['total_s'] > args.budget:
+            failures.append(f"{entry_point}: cold import took {result['total_s']:.2f}s, budget is {args.budget:.2f}s")
+        if result['loaded_lazy_modules']:
+            failures.append(f"{entry_point}: heavy modules loaded at startup: "
+                            f"{', '.join(result['loaded_lazy_modules'])}")
+    print(json.dumps(report, indent=2))
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic_city import SyntheticCity, FakeGeocoder, FakeORSClient
+from utils import map_utils
+from agents.route_agent import RouteAgent
+from database import database
+from database.preferences import PreferenceStore
+from utils import metrics
+
+# Micro-benchmarks and a concurrent load generator for the planning pipeline.
+# Upstream services are replaced by local stand-ins so runs are repeatable:
+#   python -m benchmarks.run --output bench.json
+
+
+def _summarize(latencies, elapsed=None):
+    """Latency percentiles in milliseconds, plus throughput when elapsed is given"""
+    ms = np.asarray(latencies) * 1000
+    summary = {
+        'count': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+    if elapsed is not None:
+        summary['throughput_per_s'] = len(ms) / elapsed if elapsed > 0 else float('inf')
+    return summary
+
+
+def bench(fn, iterations=200, warmup=10, setup=None):
+    """Time fn over several iterations; setup runs before each call and is not timed"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    latencies = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return _summarize(latencies)
+
+
+def install_stand_ins(city, latency=0.0):
+    """Point map_utils at the local Nominatim/ORS stand-ins"""
+    map_utils.geolocator = FakeGeocoder(city, latency=latency)
+    map_utils.client = FakeORSClient(city, latency=latency)
+    clear_caches()
+
+
+def clear_caches():
+    map_utils._geocode_cache.clear()
+    map_utils._route_cache.clear()
+    database.clear_cached_values()
+
+
+def run_micro_benchmarks(city, iterations, seed):
+    agent = RouteAgent(rng=np.random.default_rng(seed))
+    origin, destination = city.sample_od_pairs(1)[0]
+    base_route = map_utils.get_route(origin, destination)
+    results = {}
+
+    results['geocode_location.cold'] = bench(
+        lambda: map_utils.geocode_location(origin), iterations, setup=clear_caches
+    )
+    results['geocode_location.warm'] = bench(
+        lambda: map_utils.geocode_location(origin), iterations
+    )
+    results['get_route.cold'] = bench(
+        lambda: map_utils.get_route(origin, destination), iterations, setup=clear_caches
+    )
+    results['get_route.warm'] = bench(
+        lambda: map_utils.get_route(origin, destination), iterations
+    )
+    results['RouteAgent.get_route_recommendations'] = bench(
+        lambda: agent.get_route_recommendations(origin, destination, "Bus", "Balanced"), iterations
+    )
+    results['RouteAgent._create_alternative_route'] = bench(
+        lambda: agent._create_alternative_route(base_route, origin, destination, 1), iterations
+    )
+
+    scenario = city.sample_od_pairs(1000)
+    results['RouteAgent.simulate_trips[1000]'] = bench(
+        lambda: agent.simulate_trips(scenario, seed=seed), max(1, iterations // 20), warmup=1
+    )
+
+    route = agent.get_route_recommendations(origin, destination, "Bus", "Balanced")[0]
+    results['database.save_route'] = bench(
+        lambda: database.save_route(origin, destination, route), iterations
+    )
+    results['database.get_history'] = bench(database.get_history, iterations)
+    # Planning and the app read preferences through the store, not the database
+    store = PreferenceStore()
+    results['PreferenceStore.get.cold'] = bench(lambda: store.get(1), iterations, setup=store.invalidate)
+    results['PreferenceStore.get.warm'] = bench(lambda: store.get(1), iterations)
+
+    try:
+        import torch
+        from models.traffic_model import TrafficPredictor, predict_traffic
+    except ImportError:
+        results['predict_traffic'] = {'skipped': 'torch is not installed'}
+    else:
+        torch.manual_seed(0)
+        model = TrafficPredictor(input_size=4, hidden_size=32, num_layers=2, output_size=1)
+        inputs = torch.randn(16, 24, 4)
+        results['predict_traffic'] = bench(lambda: predict_traffic(model, inputs), iterations)
+
+    return results
+
+
+def run_load(city, requests, concurrency, seed):
+    """Plan requests for sampled OD pairs from concurrent clients"""
+    agent = RouteAgent(rng=np.random.default_rng(seed))
+    od_pairs = city.sample_od_pairs(requests)
+    clear_caches()
+
+    def plan(pair):
+        start = time.perf_counter()
+        agent.get_route_recommendations(pair[0], pair[1], "Bus", "Balanced")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(plan, od_pairs))
+    elapsed = time.perf_counter() - start
+
+    summary = _summarize(latencies, elapsed)
+    summary['concurrency'] = concurrency
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the route planning pipeline")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--city-size', type=int, default=10, help="stations per side of the grid")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated upstream latency in seconds")
+    parser.add_argument('--requests', type=int, default=500, help="requests for the load test")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--metrics', action='store_true', help="enable instrumentation and include it in the report")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+    city = SyntheticCity(size=args.city_size, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        # Keep benchmark writes out of the real database
+        database.DB_PATH = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        install_stand_ins(city, latency=args.latency)
+
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'params': vars(args),
+            'micro': run_micro_benchmarks(city, args.iterations, args.seed),
+        }
+        if not args.skip_load:
+            report['load'] = run_load(city, args.requests, args.concurrency, args.seed)
+        if args.metrics:
+            report['metrics'] = metrics.snapshot()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import time
+import numpy as np
+
+# Deterministic synthetic city used by the benchmarks: a grid of stations,
+# seeded origin/destination demand, and local stand-ins for Nominatim and ORS.
+
+CITY_CENTER = (77.2090, 28.6139)  # (lng, lat), New Delhi
+GRID_SPACING = 0.01  # degrees between neighbouring stations (~1 km)
+AVERAGE_SPEED_KMH = 25.0
+
+
+class SyntheticCity:
+    """Grid city with named stations and a seeded OD demand matrix"""
+
+    def __init__(self, size=10, seed=42):
+        self.size = size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        # Stations sit on grid nodes: station i is at row i // size, column i % size
+        rows, cols = np.divmod(np.arange(size * size), size)
+        offset = (size - 1) / 2
+        self.coords = np.column_stack([
+            CITY_CENTER[0] + (cols - offset) * GRID_SPACING,
+            CITY_CENTER[1] + (rows - offset) * GRID_SPACING,
+        ])
+        self.names = [f"Station {i}" for i in range(size * size)]
+        self._index = {name.lower(): i for i, name in enumerate(self.names)}
+
+        # Gravity-style demand: central stations attract more trips
+        distance_to_center = np.hypot(cols - offset, rows - offset)
+        weights = 1.0 / (1.0 + distance_to_center)
+        self.demand_weights = weights / weights.sum()
+        self._rng = rng
+
+    def station_index(self, name):
+        return self._index.get(name.strip().lower())
+
+    def sample_od_pairs(self, n):
+        """Draw n (origin, destination) station-name pairs from the demand distribution"""
+        origins = self._rng.choice(len(self.names), size=n, p=self.demand_weights)
+        destinations = self._rng.choice(len(self.names), size=n, p=self.demand_weights)
+        # Avoid zero-length trips
+        same = origins == destinations
+        destinations[same] = (destinations[same] + 1) % len(self.names)
+        return [(self.names[o], self.names[d]) for o, d in zip(origins, destinations)]
+
+    def grid_path(self, start_coords, end_coords):
+        """Manhattan path along the grid between two points: (N, 2) lng/lat array"""
+        start = np.asarray(start_coords, dtype=float)
+        end = np.asarray(end_coords, dtype=float)
+        steps_x = max(1, int(round(abs(end[0] - start[0]) / GRID_SPACING)) * 4)
+        steps_y = max(1, int(round(abs(end[1] - start[1]) / GRID_SPACING)) * 4)
+        leg_x = np.column_stack([np.linspace(start[0], end[0], steps_x + 1), np.full(steps_x + 1, start[1])])
+        leg_y = np.column_stack([np.full(steps_y, end[0]), np.linspace(start[1], end[1], steps_y + 1)[1:]])
+        return np.vstack([leg_x, leg_y])
+
+
+class _Location:
+    def __init__(self, longitude, latitude):
+        self.longitude = longitude
+        self.latitude = latitude
+
+
+class FakeGeocoder:
+    """Stand-in for geopy's Nominatim that resolves synthetic station names"""
+
+    def __init__(self, city, latency=0.0):
+        self.city = city
+        self.latency = latency
+
+    def geocode(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        index = self.city.station_index(query)
+        if index is None:
+            return None
+        lng, lat = self.city.coords[index]
+        return _Location(float(lng), float(lat))
+
+
+class FakeORSClient:
+    """Stand-in for openrouteservice.Client returning grid routes in ORS GeoJSON shape"""
+
+    def __init__(self, city, latency=0.0):
+        self.city = city
+        self.latency = latency
+
+    def directions(self, coordinates, profile='driving-car', format='geojson'):
+        if self.latency:
+            time.sleep(self.latency)
+        legs = [
+            self.city.grid_path(coordinates[i], coordinates[i + 1])
+            for i in range(len(coordinates) - 1)
+        ]
+        path = np.vstack([legs[0]] + [leg[1:] for leg in legs[1:]])
+
+        # Approximate metres along the path using a local equirectangular projection
+        lat_scale = np.cos(np.radians(path[:, 1].mean()))
+        deltas = np.diff(path, axis=0) * [111320.0 * lat_scale, 110540.0]
+        distance = float(np.hypot(deltas[:, 0], deltas[:, 1]).sum())
+        duration = distance / (AVERAGE_SPEED_KMH / 3.6)
+
+        return {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'properties': {
+                        'segments': [{'distance': distance, 'duration': duration}],
+                        'summary': {'distance': distance, 'duration': duration},
+                    },
+                    'geometry': {'type': 'LineString', 'coordinates': path.tolist()},
+                }
+            ],
+        }
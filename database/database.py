@@ -1,115 +1,338 @@
 import sqlite3
 import json
+import queue
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from utils import metrics
+from models.route import Route
+from models.eta_calibration import get_eta_calibrator
 
+DB_PATH = 'transit.db'
+
+DEFAULT_PREFERENCES = {
+    'walking_speed': 'moderate',
+    'max_walking_time': 15,
+    'crowd_tolerance': 'moderate',
+    'safety_priority': 7,
+    'voice_guidance': True,
+    'congestion_alerts': True,
+    'delay_alerts': True,
+    'safety_alerts': True,
+    'emergency_contact': ''
+}
+
+# Pooled connections, borrowed per call. Streamlit runs each rerun on a new script
+# thread, so per-thread connections would be reopened on every interaction.
+POOL_SIZE = 8
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+def _connect():
+    # Wait on locks held by other processes (e.g. the precompute job) instead of failing.
+    # Pooled connections move between threads but are only used by one at a time.
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    # With WAL, NORMAL sync is still crash-safe and makes commits much cheaper
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection; statements in the block commit together, or roll back on error"""
+    try:
+        path, conn = _pool.get_nowait()
+    except queue.Empty:
+        path, conn = DB_PATH, None
+    if conn is None or path != DB_PATH:
+        # DB_PATH changed (benchmarks, precompute workers): drop connections to the old file
+        if conn is not None:
+            conn.close()
+        path, conn = DB_PATH, _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        try:
+            _pool.put_nowait((path, conn))
+        except queue.Full:
+            conn.close()
+
+@metrics.timed('db_call_seconds', op='init_db')
 def init_db():
-    conn = sqlite3.connect('transit.db')
-    c = conn.cursor()
-    
-    # Create tables
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            preferences TEXT
-        )
-    ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS travel_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            start_location TEXT,
-            end_location TEXT,
-            route_data TEXT,
-            travel_time INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            route_id INTEGER,
-            predicted_time INTEGER,
-            confidence REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Insert default user if not exists
-    c.execute('''
-        INSERT OR IGNORE INTO users (id, username, preferences) 
-        VALUES (1, 'default_user', '{}')
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def save_route(start, end, route_data):
-    conn = sqlite3.connect('transit.db')
-    c = conn.cursor()
-    
-    # For simplicity, using a default user ID
-    user_id = 1
-    
-    c.execute('''
-        INSERT INTO travel_history (user_id, start_location, end_location, route_data, travel_time)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, start, end, json.dumps(route_data), route_data['duration']))
-    
-    conn.commit()
-    conn.close()
-
-def get_history():
-    conn = sqlite3.connect('transit.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT id, start_location, end_location, travel_time, timestamp 
-        FROM travel_history 
-        ORDER BY timestamp DESC
-    ''')
-    
-    history = c.fetchall()
-    conn.close()
-    
-    return history
+    with connection() as conn:
+        c = conn.cursor()
+    
+        # WAL lets the app keep reading while background jobs write
+        c.execute('PRAGMA journal_mode=WAL')
+    
+        # Create tables
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                preferences TEXT,
+                preferences_version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+    
+        # Databases created before preference versioning lack the column
+        columns = [row[1] for row in c.execute('PRAGMA table_info(users)')]
+        if 'preferences_version' not in columns:
+            c.execute('ALTER TABLE users ADD COLUMN preferences_version INTEGER NOT NULL DEFAULT 0')
+    
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS travel_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                start_location TEXT,
+                end_location TEXT,
+                route_data TEXT,
+                travel_time INTEGER,
+                actual_time REAL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+    
+        # Measured trip durations were added after the table; travel_time is the planned ETA
+        columns = [row[1] for row in c.execute('PRAGMA table_info(travel_history)')]
+        if 'actual_time' not in columns:
+            c.execute('ALTER TABLE travel_history ADD COLUMN actual_time REAL')
+    
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                route_id INTEGER,
+                predicted_time INTEGER,
+                confidence REAL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS upstream_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+    
+        # Insert default user if not exists
+        c.execute('''
+            INSERT OR IGNORE INTO users (id, username, preferences) 
+            VALUES (1, 'default_user', '{}')
+        ''')
+
+@metrics.timed('db_call_seconds', op='save_route')
+def save_route(start, end, route_data, user_id=1):
+    """Save a chosen route to history; returns the trip id for record_actual_time"""
+    if isinstance(route_data, Route):
+        route_data = route_data.to_dict()
+    
+    calibrator = get_eta_calibrator()
+    
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            INSERT INTO travel_history (user_id, start_location, end_location, route_data, travel_time)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, start, end, json.dumps(route_data), route_data['duration']))
+        route_id = c.lastrowid
+    
+        coords = route_data.get('geometry', {}).get('coordinates')
+        if coords:
+            # Record the ETA given for this trip and how well calibrated it was
+            estimate = calibrator.estimate(coords[0], coords[-1])
+            c.execute('''
+                INSERT INTO predictions (route_id, predicted_time, confidence)
+                VALUES (?, ?, ?)
+            ''', (route_id, route_data['duration'], estimate.confidence if estimate else None))
+    
+    return route_id
+
+@metrics.timed('db_call_seconds', op='record_actual_time')
+def record_actual_time(trip_id, minutes):
+    """Store a trip's measured duration and feed it to ETA calibration"""
+    # Load the calibrator (it reads measured trips) before this one is stored, so it is counted once
+    calibrator = get_eta_calibrator()
+    
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('UPDATE travel_history SET actual_time = ? WHERE id = ?', (minutes, trip_id))
+        if c.rowcount == 0:
+            raise KeyError(f"Unknown trip {trip_id}")
+        c.execute('SELECT route_data, timestamp FROM travel_history WHERE id = ?', (trip_id,))
+        route_data, timestamp = c.fetchone()
+    
+    if route_data:
+        calibrator.observe_trip(json.loads(route_data), minutes, timestamp)
+
+@metrics.timed('db_call_seconds', op='get_history')
+def get_history(user_id=None):
+    with connection() as conn:
+        c = conn.cursor()
+    
+        if user_id is None:
+            c.execute('''
+                SELECT id, start_location, end_location, travel_time, timestamp 
+                FROM travel_history 
+                ORDER BY timestamp DESC
+            ''')
+        else:
+            c.execute('''
+                SELECT id, start_location, end_location, travel_time, timestamp 
+                FROM travel_history 
+                WHERE user_id = ?
+                ORDER BY timestamp DESC
+            ''', (user_id,))
+    
+        history = c.fetchall()
+    
+        return history
 
+@metrics.timed('db_call_seconds', op='get_history_routes')
+def get_history_routes():
+    """(route_data dict, actual_time, timestamp) for every trip with a measured duration"""
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            SELECT route_data, actual_time, timestamp FROM travel_history
+            WHERE actual_time IS NOT NULL
+        ''')
+    
+        return [(json.loads(row[0]) if row[0] else None, row[1], row[2]) for row in c.fetchall()]
+
+@metrics.timed('db_call_seconds', op='get_user_preferences')
 def get_user_preferences(user_id=1):
-    conn = sqlite3.connect('transit.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT preferences FROM users WHERE id = ?', (user_id,))
-    preferences = c.fetchone()
-    
-    conn.close()
-    
-    if preferences and preferences[0]:
-        return json.loads(preferences[0])
-    else:
-        return {
-            'walking_speed': 'moderate',
-            'max_walking_time': 15,
-            'crowd_tolerance': 'moderate',
-            'safety_priority': 7,
-            'voice_guidance': True,
-            'congestion_alerts': True,
-            'delay_alerts': True,
-            'safety_alerts': True,
-            'emergency_contact': ''
-        }
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('SELECT preferences FROM users WHERE id = ?', (user_id,))
+        preferences = c.fetchone()
+    
+        if preferences and preferences[0]:
+            return json.loads(preferences[0])
+        else:
+            return dict(DEFAULT_PREFERENCES)
+
+@metrics.timed('db_call_seconds', op='load_user_preferences')
+def load_user_preferences(user_id):
+    """Stored preferences and their version: (dict or None, version)"""
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('SELECT preferences, preferences_version FROM users WHERE id = ?', (user_id,))
+        row = c.fetchone()
+    
+        if row is None:
+            return None, 0
+        return (json.loads(row[0]) if row[0] else None), row[1]
+
+@metrics.timed('db_call_seconds', op='get_preferences_version')
+def get_preferences_version(user_id):
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('SELECT preferences_version FROM users WHERE id = ?', (user_id,))
+        row = c.fetchone()
+    
+        return row[0] if row else 0
 
+@metrics.timed('db_call_seconds', op='save_user_preferences')
 def save_user_preferences(preferences, user_id=1):
-    conn = sqlite3.connect('transit.db')
-    c = conn.cursor()
+    """Store preferences and bump their version; returns the new version.
+
+    Raises KeyError for an unknown user; users are created with get_or_create_user.
+    """
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            UPDATE users
+            SET preferences = ?, preferences_version = preferences_version + 1
+            WHERE id = ?
+        ''', (json.dumps(preferences), user_id))
+        if c.rowcount == 0:
+            raise KeyError(f"Unknown user {user_id}")
+    
+        c.execute('SELECT preferences_version FROM users WHERE id = ?', (user_id,))
+        version = c.fetchone()[0]
     
-    c.execute('''
-        UPDATE users 
-        SET preferences = ?
-        WHERE id = ?
-    ''', (json.dumps(preferences), user_id))
+        return version
+
+@metrics.timed('db_call_seconds', op='get_or_create_user')
+def get_or_create_user(username):
+    """Id of the user with this username, creating the user if needed"""
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            INSERT OR IGNORE INTO users (username, preferences) 
+            VALUES (?, '{}')
+        ''', (username,))
+        c.execute('SELECT id FROM users WHERE username = ?', (username,))
+        user_id = c.fetchone()[0]
+    
+        return user_id
+
+@metrics.timed('db_call_seconds', op='get_popular_od_pairs')
+def get_popular_od_pairs(top_n=20, bucket_hours=3):
+    """Most requested (start, end) pairs per local time-of-day bucket: {bucket: [(start, end, trips), ...]}"""
+    with connection() as conn:
+        c = conn.cursor()
+    
+        # Timestamps are stored in UTC (CURRENT_TIMESTAMP); peak hours are local
+        c.execute('''
+            SELECT CAST(strftime('%H', timestamp, 'localtime') AS INTEGER) / ? AS bucket,
+                   start_location, end_location, COUNT(*) AS trips
+            FROM travel_history
+            GROUP BY bucket, start_location, end_location
+            ORDER BY bucket, trips DESC
+        ''', (bucket_hours,))
+    
+        popular = {}
+        for bucket, start, end, trips in c.fetchall():
+            pairs = popular.setdefault(bucket, [])
+            if len(pairs) < top_n:
+                pairs.append((start, end, trips))
+    
+        return popular
+
+@metrics.timed('db_call_seconds', op='get_cached_value')
+def get_cached_value(namespace, key):
+    """Shared upstream cache lookup: (value, created_at) or None"""
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            SELECT value, created_at FROM upstream_cache
+            WHERE namespace = ? AND key = ?
+        ''', (namespace, key))
+        row = c.fetchone()
+    
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+@metrics.timed('db_call_seconds', op='set_cached_value')
+def set_cached_value(namespace, key, value):
+    with connection() as conn:
+        c = conn.cursor()
+    
+        c.execute('''
+            INSERT OR REPLACE INTO upstream_cache (namespace, key, value, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (namespace, key, json.dumps(value), time.time()))
+
+def clear_cached_values(namespace=None):
+    with connection() as conn:
+        c = conn.cursor()
     
-    conn.commit()
-    conn.close()
\ No newline at end of file
+        if namespace is None:
+            c.execute('DELETE FROM upstream_cache')
+        else:
+            c.execute('DELETE FROM upstream_cache WHERE namespace = ?', (namespace,))
@@ -0,0 +1,158 @@
+import threading
+import time
+from dataclasses import dataclass, asdict, fields, replace
+
+from database.database import (
+    DEFAULT_PREFERENCES, load_user_preferences, get_preferences_version, save_user_preferences
+)
+from utils import metrics
+
+# How often a cached entry is checked against the stored version, so a change
+# written by another process is picked up without a full read on every request
+REVALIDATE_SECONDS = 30
+
+
+# Allowed values, matching the choices and sliders offered in the app
+PREFERENCE_CHOICES = {
+    'walking_speed': ('slow', 'moderate', 'fast'),
+    'crowd_tolerance': ('avoid crowds', 'moderate', 'no preference'),
+}
+PREFERENCE_RANGES = {
+    'max_walking_time': (5, 30),
+    'safety_priority': (1, 10),
+}
+
+
+def _coerce(name, kind, value):
+    """value converted to the field's type; ValueError if it is not a valid setting"""
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        raise ValueError(f"{name} must be true or false, got {value!r}")
+    if kind is int:
+        # bool is an int subclass, but True is not a walking time
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"{name} must be an integer, got {value!r}")
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer, got {value!r}") from None
+        if not number.is_integer():
+            raise ValueError(f"{name} must be an integer, got {value!r}")
+        low, high = PREFERENCE_RANGES[name]
+        if not low <= number <= high:
+            raise ValueError(f"{name} must be between {low} and {high}, got {value!r}")
+        return int(number)
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string, got {value!r}")
+    if name in PREFERENCE_CHOICES:
+        value = value.strip().lower()
+        if value not in PREFERENCE_CHOICES[name]:
+            raise ValueError(f"{name} must be one of {', '.join(PREFERENCE_CHOICES[name])}, got {value!r}")
+    return value
+
+
+@dataclass(frozen=True)
+class UserPreferences:
+    """A user's travel and notification preferences"""
+    walking_speed: str = DEFAULT_PREFERENCES['walking_speed']
+    max_walking_time: int = DEFAULT_PREFERENCES['max_walking_time']
+    crowd_tolerance: str = DEFAULT_PREFERENCES['crowd_tolerance']
+    safety_priority: int = DEFAULT_PREFERENCES['safety_priority']
+    voice_guidance: bool = DEFAULT_PREFERENCES['voice_guidance']
+    congestion_alerts: bool = DEFAULT_PREFERENCES['congestion_alerts']
+    delay_alerts: bool = DEFAULT_PREFERENCES['delay_alerts']
+    safety_alerts: bool = DEFAULT_PREFERENCES['safety_alerts']
+    emergency_contact: str = DEFAULT_PREFERENCES['emergency_contact']
+
+    @classmethod
+    def from_dict(cls, data, strict=True):
+        """Build from a dict, filling in defaults and ignoring unknown keys.
+
+        Values are checked and coerced to the field types; an invalid value raises
+        ValueError, or falls back to the field's default when strict is False.
+        """
+        values = {}
+        for f in fields(cls):
+            if f.name not in (data or {}):
+                continue
+            try:
+                values[f.name] = _coerce(f.name, f.type, data[f.name])
+            except ValueError:
+                if strict:
+                    raise
+        return cls(**values)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def updated(self, **changes):
+        return replace(self, **changes)
+
+
+class PreferenceStore:
+    """Read-through, write-through in-memory cache of UserPreferences keyed by user id"""
+
+    def __init__(self, revalidate_seconds=REVALIDATE_SECONDS):
+        self.revalidate_seconds = revalidate_seconds
+        # user_id -> (preferences, version, checked_at)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Preferences for user_id, from memory when the cached version is still current"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+        if entry is not None:
+            preferences, version, checked_at = entry
+            now = time.monotonic()
+            if now - checked_at < self.revalidate_seconds:
+                metrics.increment('cache_hits_total', cache='preferences')
+                return preferences
+            # Cheap version check instead of re-reading and parsing the preferences
+            if get_preferences_version(user_id) == version:
+                with self._lock:
+                    self._entries[user_id] = (preferences, version, now)
+                metrics.increment('cache_hits_total', cache='preferences')
+                return preferences
+
+        metrics.increment('cache_misses_total', cache='preferences')
+        data, version = load_user_preferences(user_id)
+        # Rows written before preferences were validated may hold bad values; don't fail reads on them
+        preferences = UserPreferences.from_dict(data, strict=False)
+        with self._lock:
+            self._entries[user_id] = (preferences, version, time.monotonic())
+        return preferences
+
+    def save(self, user_id, preferences):
+        """Persist preferences and update the cached copy.
+
+        KeyError if the user does not exist, ValueError if a preference value is invalid.
+        """
+        if isinstance(preferences, dict):
+            preferences = UserPreferences.from_dict(preferences)
+        version = save_user_preferences(preferences.to_dict(), user_id)
+        with self._lock:
+            self._entries[user_id] = (preferences, version, time.monotonic())
+        return preferences
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_preference_store():
+    """Process-wide preference store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PreferenceStore()
+        return _store
@@ -0,0 +1,177 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from database import database
+from utils.map_utils import HOST_LIMITS
+
+# Off-peak job that warms the shared upstream cache (geocodes and routes in the
+# upstream_cache table) for the most requested OD pairs in travel_history, so peak
+# requests for common commutes skip Nominatim and ORS. Run before the morning peak:
+#   python -m jobs.precompute_routes --top 20 --hours 6-10
+
+DEFAULT_PROGRESS_FILE = 'precompute_progress.json'
+
+
+def _init_worker(db_path, host_limits):
+    # Spawned workers start with a fresh interpreter, so point them at the same database
+    database.DB_PATH = db_path
+    # Share the per-host limits across all workers, so N processes still make at most
+    # HOST_LIMITS[host] concurrent requests to each upstream between them
+    from utils import map_utils
+    map_utils._host_limits = host_limits
+
+
+def _precompute(task):
+    """Plan one OD pair in a worker process; planning fills the shared cache as a side effect.
+
+    Returns (task id, status, seconds) where status is 'cached', 'not_found', or
+    'not_cached' when planning fell back to a stale or estimated route (e.g. ORS is down).
+    """
+    from agents.route_agent import RouteAgent
+    from utils.map_utils import is_journey_cached
+
+    start = time.perf_counter()
+    agent = RouteAgent()
+    routes = agent.get_route_recommendations(
+        task['origin'], task['destination'], task['transport_mode'], "Balanced"
+    )
+    if routes is None:
+        status = 'not_found'
+    elif is_journey_cached(task['origin'], task['destination'], agent._get_profile(task['transport_mode'])):
+        status = 'cached'
+    else:
+        status = 'not_cached'
+    return task['id'], status, time.perf_counter() - start
+
+
+def _parse_hours(value):
+    """Hours for --hours 'H' or 'H1-H2' (0-23); a range may wrap past midnight, e.g. 22-2"""
+    if not value:
+        return None
+    first, _, last = value.partition('-')
+    first, last = int(first), int(last or first)
+    if not (0 <= first <= 23 and 0 <= last <= 23):
+        raise ValueError(f"hours must be between 0 and 23, got {value!r}")
+    return [(first + i) % 24 for i in range((last - first) % 24 + 1)]
+
+
+def build_tasks(top_n, bucket_hours, hours, transport_mode):
+    """Top OD pairs per time bucket, deduplicated across buckets"""
+    popular = database.get_popular_od_pairs(top_n, bucket_hours)
+    tasks = {}
+    for bucket, pairs in sorted(popular.items()):
+        bucket_hours_range = range(bucket * bucket_hours, (bucket + 1) * bucket_hours)
+        if hours is not None and not set(bucket_hours_range) & set(hours):
+            continue
+        for origin, destination, _ in pairs:
+            task_id = f"{transport_mode}|{origin}|{destination}"
+            tasks.setdefault(task_id, {
+                'id': task_id,
+                'origin': origin,
+                'destination': destination,
+                'transport_mode': transport_mode,
+            })
+    return list(tasks.values())
+
+
+def _load_progress(path):
+    try:
+        with open(path) as f:
+            return set(json.load(f).get('done', []))
+    except (FileNotFoundError, ValueError):
+        return set()
+
+
+def _save_progress(path, done):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'done': sorted(done), 'updated_at': time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def run(tasks, workers, progress_path=None):
+    """Precompute tasks across worker processes; returns a throughput report"""
+    done = _load_progress(progress_path) if progress_path else set()
+    pending = [task for task in tasks if task['id'] not in done]
+    completed, not_found, not_cached, errors = 0, 0, 0, 0
+    latencies = []
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    host_limits = {host: context.BoundedSemaphore(limit) for host, limit in HOST_LIMITS.items()}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(os.path.abspath(database.DB_PATH), host_limits)
+    ) as executor:
+        futures = [executor.submit(_precompute, task) for task in pending]
+        for future in as_completed(futures):
+            try:
+                task_id, status, seconds = future.result()
+            except Exception as e:
+                print(f"Error precomputing route: {e}")
+                errors += 1
+                continue
+            latencies.append(seconds)
+            if status == 'not_found':
+                not_found += 1
+                continue
+            if status == 'not_cached':
+                # Only a real upstream route counts; retry this pair on the next run
+                not_cached += 1
+                continue
+            completed += 1
+            done.add(task_id)
+            if progress_path:
+                _save_progress(progress_path, done)
+    elapsed = time.perf_counter() - started
+
+    # A finished run starts over next time instead of skipping everything
+    if progress_path and not (not_found or not_cached or errors) and os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    return {
+        'tasks': len(tasks),
+        'skipped_already_done': len(tasks) - len(pending),
+        'completed': completed,
+        'not_found': not_found,
+        'not_cached': not_cached,
+        'errors': errors,
+        'workers': workers,
+        'elapsed_s': elapsed,
+        'throughput_per_s': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'mean_task_s': sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm route caches for popular OD pairs")
+    parser.add_argument('--top', type=int, default=20, help="OD pairs per time bucket")
+    parser.add_argument('--bucket-hours', type=int, default=3)
+    parser.add_argument('--hours', help="only buckets overlapping these local hours, e.g. 6-10 or 22-2")
+    parser.add_argument('--mode', default="Bus", help="transport mode to plan for")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--progress', default=DEFAULT_PROGRESS_FILE, help="progress file for resuming")
+    parser.add_argument('--fresh', action='store_true', help="ignore previous progress")
+    args = parser.parse_args()
+    try:
+        hours = _parse_hours(args.hours)
+    except ValueError as e:
+        parser.error(f"--hours: {e}")
+
+    database.init_db()
+    if args.fresh and os.path.exists(args.progress):
+        os.remove(args.progress)
+
+    tasks = build_tasks(args.top, args.bucket_hours, hours, args.mode)
+    report = run(tasks, args.workers, args.progress)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
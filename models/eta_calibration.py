@@ -0,0 +1,147 @@
+import math
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from models.route import VARIANT_FACTORS
+
+# Calibrated ETAs from measured trip durations. Durations are kept in streaming
+# quantile sketches per (origin cell, destination cell, time-of-day bucket); the
+# estimate for a key is refreshed on every observation, so planning-time lookups
+# are a single dict access. Only measured times (travel_history.actual_time) are
+# observed, never the planner's own ETAs.
+
+CELL_SIZE_DEGREES = 0.01  # ~1 km grid cells
+BUCKET_HOURS = 3  # local time-of-day buckets, like the precompute job's default
+MIN_SAMPLES = 5  # observations needed before an ETA is calibrated
+INTERVAL_QUANTILES = (0.1, 0.9)
+
+EtaEstimate = namedtuple('EtaEstimate', ['median', 'low', 'high', 'samples', 'confidence'])
+
+
+def local_hour(timestamp):
+    """Local hour of a SQLite CURRENT_TIMESTAMP string, which is UTC"""
+    return datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).astimezone().hour
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with log-spaced buckets and bounded relative error"""
+
+    __slots__ = ('gamma', '_log_gamma', 'min_value', 'counts', 'count')
+
+    def __init__(self, relative_accuracy=0.02, min_value=0.1):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        # bucket index -> count; the number of buckets grows only with log(max / min)
+        self.counts = {}
+        self.count = 0
+
+    def update(self, value):
+        index = math.ceil(math.log(max(value, self.min_value)) / self._log_gamma)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i], within relative_accuracy of the true value
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.counts) / (self.gamma + 1)
+
+
+class EtaCalibrator:
+    """Per OD cell and time bucket duration statistics with O(1) calibrated ETA lookups"""
+
+    def __init__(self, cell_size=CELL_SIZE_DEGREES, bucket_hours=BUCKET_HOURS, min_samples=MIN_SAMPLES):
+        self.cell_size = cell_size
+        self.bucket_hours = bucket_hours
+        self.min_samples = min_samples
+        self._sketches = {}
+        self._estimates = {}
+        self._lock = threading.Lock()
+
+    def _key(self, start, end, hour):
+        return (
+            round(start[0] / self.cell_size), round(start[1] / self.cell_size),
+            round(end[0] / self.cell_size), round(end[1] / self.cell_size),
+            hour // self.bucket_hours
+        )
+
+    def observe(self, start, end, minutes, hour=None):
+        """Record an observed trip duration (minutes) between two (lng, lat) points"""
+        if minutes is None or minutes <= 0:
+            return
+        if hour is None:
+            hour = datetime.now().hour
+        key = self._key(start, end, hour)
+
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = QuantileSketch()
+            sketch.update(minutes)
+
+            if sketch.count >= self.min_samples:
+                low_q, high_q = INTERVAL_QUANTILES
+                self._estimates[key] = EtaEstimate(
+                    median=sketch.quantile(0.5),
+                    low=sketch.quantile(low_q),
+                    high=sketch.quantile(high_q),
+                    samples=sketch.count,
+                    # Grows towards 1 as observations accumulate
+                    confidence=sketch.count / (sketch.count + self.min_samples)
+                )
+
+    def estimate(self, start, end, hour=None):
+        """Calibrated EtaEstimate for a trip, or None until the cell has enough observations"""
+        if hour is None:
+            hour = datetime.now().hour
+        return self._estimates.get(self._key(start, end, hour))
+
+    def observe_trip(self, route_data, minutes, timestamp):
+        """Record a measured trip: its route dict, actual minutes and UTC start timestamp.
+
+        Alternative routes are planned as the primary route times a variant factor, so
+        their times are divided by that factor before they are stored. Returns whether
+        the trip could be used.
+        """
+        try:
+            coords = route_data['geometry']['coordinates']
+            duration_factor, _ = VARIANT_FACTORS.get(route_data.get('variant') or 0, (1.0, 1.0))
+            # Buckets use local time like planning does
+            hour = local_hour(timestamp)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+        if not coords or minutes is None:
+            return False
+        self.observe(coords[0], coords[-1], minutes / duration_factor, hour)
+        return True
+
+    def load_history(self, rows):
+        """Bootstrap from (route_data JSON dict, actual minutes, UTC timestamp string) rows"""
+        return sum(self.observe_trip(route_data, minutes, timestamp) for route_data, minutes, timestamp in rows)
+
+
+_calibrator = None
+_calibrator_lock = threading.Lock()
+
+
+def get_eta_calibrator():
+    """Process-wide calibrator, bootstrapped from measured trips in travel_history on first use"""
+    global _calibrator
+    with _calibrator_lock:
+        if _calibrator is None:
+            calibrator = EtaCalibrator()
+            try:
+                from database.database import get_history_routes
+                calibrator.load_history(get_history_routes())
+            except Exception as e:
+                print(f"Error loading travel history for ETA calibration: {e}")
+            _calibrator = calibrator
+        return _calibrator
@@ -0,0 +1,108 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# (duration, distance) multipliers per route variant: 1 is slightly longer but less crowded,
+# 2 safer but longer
+VARIANT_FACTORS = {0: (1.0, 1.0), 1: (1.1, 1.05), 2: (1.2, 1.1)}
+
+# Simulated direction steps and the bus lines they are filled from. Voice guidance
+# pre-renders the templated steps, so both are shared from here.
+FIRST_LINES = range(1, 15)
+TRANSFER_LINES = range(20, 35)
+STEP_TEMPLATES = (
+    "Walk to {origin} station",
+    "Take bus line {first_line} towards city center",
+    "Transfer at Central Station to bus line {transfer_line}",
+    "Get off at {destination} station",
+    "Walk to your destination",
+)
+
+# Fields shared by Route and its dict form, in to_dict() order
+ROUTE_FIELDS = ('origin', 'destination', 'distance', 'duration', 'crowd_level', 'safety_score', 'steps', 'variant',
+                'eta_interval')
+
+
+def cumulative_distances(coords):
+    """Cumulative great-circle distance in km along an (N, 2) lng/lat array, starting at 0"""
+    if len(coords) < 2:
+        return np.zeros(len(coords))
+    lng, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    segments = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    return np.concatenate(([0.0], np.cumsum(segments)))
+
+
+class Route:
+    """A planned route with its coordinates stored as a contiguous float64 (N, 2) lng/lat array"""
+
+    __slots__ = ROUTE_FIELDS + ('coords', 'cumulative_km')
+
+    def __init__(self, origin, destination, distance, duration, crowd_level, safety_score,
+                 coords, steps, variant=0, eta_interval=None):
+        self.origin = origin
+        self.destination = destination
+        self.distance = distance
+        self.duration = duration
+        self.crowd_level = crowd_level
+        self.safety_score = safety_score
+        self.steps = steps
+        self.variant = variant
+        # (low, high) minutes from historical calibration, None when uncalibrated
+        self.eta_interval = tuple(eta_interval) if eta_interval is not None else None
+        # No copy is made when coords is already a contiguous float64 array
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.cumulative_km = cumulative_distances(self.coords)
+
+    @property
+    def geometry(self):
+        """GeoJSON LineString for the edges (maps, JSON, database)"""
+        return {'type': 'LineString', 'coordinates': self.coords.tolist()}
+
+    @property
+    def length_km(self):
+        return float(self.cumulative_km[-1]) if len(self.cumulative_km) else 0.0
+
+    def position_at(self, fraction):
+        """(lng, lat) at the given fraction of the route's length"""
+        if len(self.coords) == 1:
+            return tuple(self.coords[0])
+        target = min(max(fraction, 0.0), 1.0) * self.cumulative_km[-1]
+        lng = np.interp(target, self.cumulative_km, self.coords[:, 0])
+        lat = np.interp(target, self.cumulative_km, self.coords[:, 1])
+        return (float(lng), float(lat))
+
+    # Dict-style access keeps code written against the old route dicts working
+    def __getitem__(self, key):
+        if key in ROUTE_FIELDS or key == 'geometry':
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if not isinstance(other, Route):
+            return NotImplemented
+        return (all(getattr(self, f) == getattr(other, f) for f in ROUTE_FIELDS)
+                and np.array_equal(self.coords, other.coords))
+
+    def __repr__(self):
+        return (f"Route({self.origin!r} -> {self.destination!r}, {self.distance} km, "
+                f"{self.duration} min, {len(self.coords)} points)")
+
+    def to_dict(self, as_lists=True):
+        """Plain dict in the old route format; as_lists=False keeps coordinates as the numpy array"""
+        data = {field: getattr(self, field) for field in ROUTE_FIELDS}
+        coordinates = self.coords.tolist() if as_lists else self.coords
+        data['geometry'] = {'type': 'LineString', 'coordinates': coordinates}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Route from the dict format (e.g. stored route_data)"""
+        values = {field: data[field] for field in ROUTE_FIELDS if field in data}
+        return cls(coords=data['geometry']['coordinates'], **values)
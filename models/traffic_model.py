@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import numpy as np
+from utils import metrics
 
 class TrafficPredictor(nn.Module):
     def __init__(self, input_size, hidden_size, num_layers, output_size):
@@ -22,7 +23,7 @@ class TrafficPredictor(nn.Module):
 def predict_traffic(model, input_data):
     """Predict traffic conditions using the trained model"""
     model.eval()
-    with torch.no_grad():
+    with metrics.span('stage_seconds', stage='model_inference'), torch.no_grad():
         predictions = model(input_data)
     return predictions
 
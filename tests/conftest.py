@@ -0,0 +1,39 @@
+import pytest
+
+from database import database
+
+from benchmarks.fake_services import FakeServices
+from benchmarks.synthetic_city import SyntheticCity
+from utils import map_utils
+from utils.service_utils import CircuitBreaker
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temp_database(tmp_path_factory):
+    """Keep test writes out of transit.db"""
+    database.DB_PATH = str(tmp_path_factory.mktemp('db') / 'transit.db')
+    database.init_db()
+    return database.DB_PATH
+
+
+@pytest.fixture(scope='session')
+def city():
+    return SyntheticCity(size=6, seed=7)
+
+
+@pytest.fixture
+def services(city, monkeypatch):
+    """Fake ORS/Nominatim server with map_utils' real clients pointed at it"""
+    with FakeServices(city) as fake:
+        monkeypatch.setattr(map_utils, 'ORS_BASE_URL', fake.url)
+        monkeypatch.setattr(map_utils, 'NOMINATIM_URL', fake.url)
+        monkeypatch.setattr(map_utils, 'client', None)
+        monkeypatch.setattr(map_utils, 'geolocator', None)
+        monkeypatch.setattr(map_utils, '_breakers', {
+            'ors': CircuitBreaker('ors'),
+            'nominatim': CircuitBreaker('nominatim'),
+        })
+        map_utils._geocode_cache.clear()
+        map_utils._route_cache.clear()
+        database.clear_cached_values()
+        yield fake
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from utils import alert_utils
+from utils.alert_utils import AlertDispatcher
+
+
+def _alert(message, alert_type='congestion', user_id=1, route_id=7):
+    return {'type': alert_type, 'message': message, 'user_id': user_id, 'route_id': route_id}
+
+
+class GatedChannel:
+    """Channel whose deliveries wait for release(), recording each batch"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self._gate = threading.Event()
+
+    def __call__(self, alerts):
+        self.started.set()
+        self._gate.wait(5)
+        self.batches.append([alert['message'] for alert in alerts])
+
+    def release(self):
+        self._gate.set()
+
+
+def test_duplicate_alerts_are_coalesced():
+    channel = GatedChannel()
+    channel.release()
+    dispatcher = AlertDispatcher(channels={'push': (channel, 1, 10)})
+
+    assert dispatcher.submit(_alert("Heavy traffic"))
+    assert not dispatcher.submit(_alert("Heavy traffic"))
+    assert dispatcher.submit(_alert("Heavy traffic", user_id=2))
+    dispatcher.join()
+
+    assert dispatcher.stats()['counts']['coalesced'] == 1
+
+
+def test_dropped_alert_is_not_coalesced_on_retry():
+    channel = GatedChannel()
+    dispatcher = AlertDispatcher(channels={'push': (channel, 1, 10)}, queue_size=1)
+    dispatcher.submit(_alert("first"))
+    channel.started.wait(5)
+    dispatcher.submit(_alert("second"))
+
+    # Queue is full: dropped, and the retry is queued once there is room
+    assert not dispatcher.submit(_alert("third"))
+    channel.release()
+    dispatcher.join()
+    assert dispatcher.submit(_alert("third"))
+    dispatcher.join()
+
+    assert channel.batches[-1] == ["third"]
+
+
+def test_alert_is_queued_on_every_channel_or_none():
+    push, sms = GatedChannel(), GatedChannel()
+    push.release()
+    dispatcher = AlertDispatcher(channels={'push': (push, 1, 10), 'sms': (sms, 1, 10)}, queue_size=1)
+    dispatcher.submit(_alert("first"))
+    sms.started.wait(5)
+    dispatcher.submit(_alert("second", user_id=2))
+    deadline = time.monotonic() + 5
+    while sum(map(len, push.batches)) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Only sms is full, yet push must not deliver an alert the caller will retry
+    assert not dispatcher.submit(_alert("third"))
+    sms.release()
+    dispatcher.join()
+    assert dispatcher.submit(_alert("third"))
+    dispatcher.join()
+
+    for channel in (push, sms):
+        delivered = [message for batch in channel.batches for message in batch]
+        assert delivered.count("third") == 1
+
+
+def test_sos_waits_at_most_the_enqueue_timeout(monkeypatch):
+    monkeypatch.setattr(alert_utils, 'SOS_ENQUEUE_TIMEOUT', 0.3)
+    channels = {name: GatedChannel() for name in ('push', 'sms', 'webhook')}
+    dispatcher = AlertDispatcher(channels={name: (channel, 1, 10) for name, channel in channels.items()},
+                                 queue_size=1)
+    dispatcher.submit(_alert("first"))
+    for channel in channels.values():
+        channel.started.wait(5)
+    dispatcher.submit(_alert("second"))
+
+    start = time.monotonic()
+    assert not dispatcher.submit(_alert("Help", alert_type='sos'))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6
+    for channel in channels.values():
+        channel.release()
+
+
+def test_workers_deliver_waiting_alerts_in_batches_most_urgent_first():
+    channel = GatedChannel()
+    dispatcher = AlertDispatcher(channels={'push': (channel, 1, 3)})
+    dispatcher.submit(_alert("first"))
+    channel.started.wait(5)
+    for i in range(4):
+        dispatcher.submit(_alert(f"congestion {i}"))
+    dispatcher.submit(_alert("Help", alert_type='sos'))
+    channel.release()
+    dispatcher.join()
+
+    assert channel.batches == [
+        ["first"],
+        ["Help", "congestion 0", "congestion 1"],
+        ["congestion 2", "congestion 3"],
+    ]
+    stats = dispatcher.stats()
+    assert stats['counts']['delivered'] == 6
+    assert stats['channels']['push']['mean_batch_size'] == 2.0
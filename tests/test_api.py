@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api.server import app
+
+
+@pytest.fixture
+def api(services):
+    with TestClient(app) as client:
+        yield client
+
+
+def test_plan_returns_routes(api, city):
+    response = api.post('/plan', json={'origin': 'Station 0', 'destination': 'Station 20'})
+
+    assert response.status_code == 200
+    routes = response.json()['routes']
+    assert len(routes) == 3
+    coordinates = routes[0]['geometry']['coordinates']
+    assert coordinates[0] == pytest.approx(city.coords[0].tolist())
+    assert coordinates[-1] == pytest.approx(city.coords[20].tolist())
+    assert routes[0]['duration'] > 0
+
+
+def test_plan_batch_returns_one_result_per_journey(api):
+    journeys = [
+        {'origin': 'Station 1', 'destination': 'Station 8'},
+        {'origin': 'Station 2', 'destination': 'Station 9', 'priority': 'Safest'},
+    ]
+    response = api.post('/plan/batch', json={'requests': journeys})
+
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert [len(result['routes']) for result in results] == [3, 3]
+
+
+def test_plan_batch_rejects_oversized_batches(api):
+    journeys = [{'origin': 'Station 1', 'destination': 'Station 2'}] * 51
+    response = api.post('/plan/batch', json={'requests': journeys})
+
+    assert response.status_code == 413
+
+
+def test_preferences_round_trip(api):
+    from database.database import get_or_create_user
+
+    user_id = get_or_create_user('api_user')
+    response = api.put('/preferences', json={'user_id': user_id, 'preferences': {'safety_priority': 9}})
+    assert response.status_code == 200
+
+    response = api.get('/preferences', params={'user_id': user_id})
+    assert response.json()['preferences']['safety_priority'] == 9
+
+
+def test_invalid_preferences_are_422_and_planning_still_works(api):
+    from database.database import get_or_create_user
+
+    user_id = get_or_create_user('api_typed_user')
+    for bad in ({'safety_priority': 'high'}, {'max_walking_time': True}, {'crowd_tolerance': 'loud'}):
+        response = api.put('/preferences', json={'user_id': user_id, 'preferences': bad})
+        assert response.status_code == 422
+
+    response = api.post('/plan', json={'origin': 'Station 0', 'destination': 'Station 20',
+                                       'priority': 'Balanced', 'user_id': user_id})
+    assert response.status_code == 200
+
+
+def test_preferences_for_unknown_user_is_404(api):
+    response = api.put('/preferences', json={'user_id': 987654, 'preferences': {}})
+
+    assert response.status_code == 404
@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import database
+
+
+def test_failed_write_rolls_back_and_releases_the_lock():
+    with pytest.raises(sqlite3.IntegrityError):
+        with database.connection() as conn:
+            conn.execute("INSERT INTO users (username, preferences) VALUES ('rollback_test', '{}')")
+            conn.execute("INSERT INTO users (id, username, preferences) VALUES (1, 'duplicate_id', '{}')")
+
+    # Another connection can write immediately, and the first insert was rolled back
+    other = sqlite3.connect(database.DB_PATH, timeout=0.1)
+    try:
+        other.execute("INSERT INTO users (username, preferences) VALUES ('other_writer', '{}')")
+        other.commit()
+        assert other.execute("SELECT COUNT(*) FROM users WHERE username = 'rollback_test'").fetchone()[0] == 0
+    finally:
+        other.close()
+
+
+def test_connections_are_reused_across_threads():
+    # Streamlit runs every rerun on a fresh thread
+    ids = []
+
+    def borrow():
+        with database.connection() as conn:
+            ids.append(id(conn))
+
+    for _ in range(3):
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        thread.join()
+
+    assert len(set(ids)) == 1
+
+
+def test_saving_preferences_does_not_clash_with_usernames():
+    from database.preferences import PreferenceStore
+
+    user_id = database.get_or_create_user('user_7')
+    other_id = database.get_or_create_user('someone_else')
+    store = PreferenceStore()
+    store.save(other_id, {'walking_speed': 'fast'})
+    store.save(user_id, {'crowd_tolerance': 'avoid crowds'})
+
+    assert store.get(other_id).walking_speed == 'fast'
+    assert PreferenceStore().get(user_id).crowd_tolerance == 'avoid crowds'
+
+
+def test_saving_preferences_for_an_unknown_user_fails_cleanly():
+    with pytest.raises(KeyError):
+        database.save_user_preferences({}, user_id=987654)
+
+    # Nothing is left locked
+    assert database.get_or_create_user('after_failed_save')
+
+
+def test_invalid_preferences_are_rejected_and_bad_stored_values_fall_back():
+    from database.preferences import PreferenceStore, UserPreferences
+
+    user_id = database.get_or_create_user('typed_prefs')
+    store = PreferenceStore()
+    with pytest.raises(ValueError):
+        store.save(user_id, {'safety_priority': 'high'})
+    assert store.save(user_id, {'safety_priority': '9', 'crowd_tolerance': 'Avoid Crowds'}).safety_priority == 9
+
+    # A row written before validation keeps its good values and defaults the bad ones
+    database.save_user_preferences({'safety_priority': 'high', 'walking_speed': 'fast'}, user_id)
+    preferences = PreferenceStore().get(user_id)
+    assert preferences.safety_priority == UserPreferences().safety_priority
+    assert preferences.walking_speed == 'fast'
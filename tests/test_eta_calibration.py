@@ -0,0 +1,85 @@
+import pytest
+
+from agents.route_agent import RouteAgent
+from database import database
+from models import eta_calibration
+from models.eta_calibration import EtaCalibrator, QuantileSketch
+
+
+@pytest.fixture
+def calibrator(monkeypatch):
+    monkeypatch.setattr(eta_calibration, '_calibrator', None)
+    yield
+    monkeypatch.setattr(eta_calibration, '_calibrator', None)
+
+
+def test_quantile_sketch_is_within_relative_accuracy():
+    sketch = QuantileSketch(relative_accuracy=0.02)
+    for minutes in range(1, 101):
+        sketch.update(minutes)
+
+    assert sketch.quantile(0.5) == pytest.approx(50.5, rel=0.03)
+    assert sketch.quantile(0.9) == pytest.approx(90.1, rel=0.03)
+
+
+def test_estimate_needs_min_samples():
+    calibrator = EtaCalibrator(min_samples=3)
+    for minutes in (20, 22):
+        calibrator.observe((77.2, 28.6), (77.25, 28.65), minutes, hour=8)
+    assert calibrator.estimate((77.2, 28.6), (77.25, 28.65), hour=8) is None
+
+    calibrator.observe((77.2, 28.6), (77.25, 28.65), 24, hour=8)
+    estimate = calibrator.estimate((77.2, 28.6), (77.25, 28.65), hour=8)
+    assert estimate.median == pytest.approx(22, rel=0.03)
+    assert estimate.low <= estimate.median <= estimate.high
+    assert calibrator.estimate((77.2, 28.6), (77.25, 28.65), hour=14) is None
+
+
+def test_saved_etas_do_not_calibrate_the_planner(services, calibrator):
+    agent = RouteAgent()
+    routes = agent.get_route_recommendations('Station 0', 'Station 14', 'Bus', 'Fastest')
+    for _ in range(6):
+        database.save_route('Station 0', 'Station 14', routes[2])
+
+    again = agent.get_route_recommendations('Station 0', 'Station 14', 'Bus', 'Fastest')
+    assert [route.duration for route in again] == [route.duration for route in routes]
+    assert all(route.eta_interval is None for route in again)
+
+
+def test_measured_times_calibrate_all_variants(services, calibrator):
+    agent = RouteAgent()
+    routes = agent.get_route_recommendations('Station 1', 'Station 15', 'Bus', 'Fastest')
+    variant_2 = next(route for route in routes if route.variant == 2)
+    for minutes in (22.0, 23.0, 24.0, 25.0, 26.0):
+        trip_id = database.save_route('Station 1', 'Station 15', variant_2)
+        database.record_actual_time(trip_id, minutes)
+
+    calibrated = {route.variant: route for route in
+                  agent.get_route_recommendations('Station 1', 'Station 15', 'Bus', 'Fastest')}
+
+    # Variant 2 is planned at 1.2x the primary route, so 24 min measured means 20 min primary
+    assert calibrated[0].duration == pytest.approx(20.0, rel=0.03)
+    assert calibrated[2].duration == pytest.approx(24.0, rel=0.03)
+    low, high = calibrated[2].eta_interval
+    assert low < calibrated[2].duration < high
+
+
+def test_calibrator_bootstraps_from_measured_trips_only(services, calibrator):
+    agent = RouteAgent()
+    route = agent.get_route_recommendations('Station 2', 'Station 16', 'Bus', 'Fastest')[0]
+    for minutes in (30.0, 31.0, 32.0, 33.0, 34.0):
+        trip_id = database.save_route('Station 2', 'Station 16', route)
+        database.record_actual_time(trip_id, minutes)
+        database.save_route('Station 2', 'Station 16', route)
+
+    # A fresh process rebuilds the same statistics from travel_history
+    eta_calibration._calibrator = None
+    coords = route.coords
+    estimate = eta_calibration.get_eta_calibrator().estimate(coords[0], coords[-1])
+    assert estimate.samples == 5
+    assert estimate.median == pytest.approx(32.0, rel=0.03)
+
+
+def test_record_actual_time_for_unknown_trip():
+    with pytest.raises(KeyError):
+        database.record_actual_time(987654, 12.0)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from models.route import Route
+from utils import map_utils
+
+
+def _zigzag(n=21, amplitude=0.01):
+    lng = np.linspace(77.0, 77.2, n)
+    lat = 28.6 + amplitude * (np.arange(n) % 2)
+    return np.column_stack([lng, lat])
+
+
+def _wiggly_line(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    lng = np.linspace(77.0, 77.3, n)
+    lat = 28.6 + np.cumsum(rng.normal(0, 0.0002, n))
+    return np.column_stack([lng, lat])
+
+
+def test_collinear_line_shrinks_to_its_endpoints():
+    line = np.column_stack([np.linspace(77.0, 77.1, 50), np.linspace(28.6, 28.7, 50)])
+
+    simplified = map_utils.simplify_coordinates(line, 1e-6)
+
+    assert simplified.tolist() == [line[0].tolist(), line[-1].tolist()]
+
+
+def test_zigzag_keeps_its_corners():
+    line = _zigzag()
+
+    simplified = map_utils.simplify_coordinates(line, 0.001)
+
+    assert np.array_equal(simplified, line)
+
+
+def test_simplification_keeps_endpoints_and_drops_small_detail():
+    line = _wiggly_line()
+
+    simplified = map_utils.simplify_coordinates(line, 0.001)
+
+    assert 2 <= len(simplified) < len(line) / 10
+    assert np.array_equal(simplified[0], line[0])
+    assert np.array_equal(simplified[-1], line[-1])
+
+
+def test_zero_tolerance_and_short_lines_are_unchanged():
+    line = _wiggly_line(50)
+    assert len(map_utils.simplify_coordinates(line, 0)) == 50
+    assert len(map_utils.simplify_coordinates(line[:2], 0.01)) == 2
+
+
+def test_higher_zoom_keeps_at_least_as_many_points():
+    line = _wiggly_line()
+
+    counts = [len(map_utils.simplify_for_zoom(line, zoom)) for zoom in (8, 11, 14, 17)]
+
+    assert counts == sorted(counts)
+    assert counts[0] < counts[-1]
+
+
+def _route(coords, variant):
+    return Route('A', 'B', 10.0, 20.0, 3, 8, coords, ['Walk'], variant=variant)
+
+
+def test_build_route_map_draws_every_alternative_with_the_selected_one_last():
+    folium = pytest.importorskip('folium')
+    base = _wiggly_line(500)
+    routes = [_route(base + [0, 0.001 * i], i) for i in range(3)]
+
+    m = map_utils.build_route_map(routes, selected_index=1, zoom_start=12)
+
+    lines = [child for child in m._children.values() if isinstance(child, folium.PolyLine)]
+    colors = [map_utils.ROUTE_COLORS[i] for i in (0, 2, 1)]
+    assert [line.options['color'] for line in lines] == colors
+    assert lines[-1].options['weight'] > lines[0].options['weight']
+    # Drawn simplified, but still from start to end
+    assert all(len(line.locations) < len(base) for line in lines)
+    assert lines[-1].locations[0] == pytest.approx([routes[1].coords[0][1], routes[1].coords[0][0]])
+    assert lines[-1].locations[-1] == pytest.approx([routes[1].coords[-1][1], routes[1].coords[-1][0]])
@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+import pytest
+
+from utils import map_utils
+
+
+def test_geocode_location_uses_nominatim(services, city):
+    coords = map_utils.geocode_location('Station 7')
+
+    assert np.allclose(coords, city.coords[7])
+    assert services.requests['search'] == 1
+
+
+def test_geocode_location_serves_repeats_from_cache(services):
+    first = map_utils.geocode_location('Station 3')
+    second = map_utils.geocode_location('  station 3 ')
+
+    assert first == second
+    assert services.requests['search'] == 1
+
+
+def test_get_route_fetches_and_caches_directions(services, city):
+    route = map_utils.get_route('Station 0', 'Station 14')
+
+    coords = route['features'][0]['geometry']['coordinates']
+    assert np.allclose(coords[0], city.coords[0])
+    assert np.allclose(coords[-1], city.coords[14])
+
+    map_utils.get_route('Station 0', 'Station 14')
+    assert services.requests['directions'] == 1
+
+
+def test_ors_client_leaves_retries_to_retry_call(services):
+    client = map_utils.get_client()
+
+    assert client._retry_timeout.total_seconds() < map_utils.ORS_TIMEOUT
+
+
+@pytest.mark.filterwarnings('ignore:Server down')
+def test_get_route_falls_back_quickly_when_ors_is_down(services):
+    map_utils.geocode_location('Station 1')
+    map_utils.geocode_location('Station 2')
+    services.fail_status = 503
+
+    start = time.perf_counter()
+    route = map_utils.get_route('Station 1', 'Station 2')
+    elapsed = time.perf_counter() - start
+
+    # Straight-line estimate from the cached geocodes
+    assert route['features'][0]['properties']['segments'][0]['duration'] > 0
+    assert elapsed < map_utils.ORS_TIMEOUT
+
+
+def test_circuit_breaker_stops_calling_a_failing_upstream(services, monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    for i in range(6):
+        map_utils.geocode_location(f'Station {i}')
+    services.fail_status = 500
+
+    for i in range(5):
+        map_utils.get_route(f'Station {i}', f'Station {i + 1}')
+    calls = services.requests['directions']
+    map_utils.get_route('Station 0', 'Station 5')
+
+    assert map_utils._breakers['ors'].state == 'open'
+    assert services.requests['directions'] == calls
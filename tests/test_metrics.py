@@ -0,0 +1,30 @@
+import json
+import os
+import time
+
+from utils import metrics
+
+
+def test_json_dump_writes_one_file_per_process(tmp_path):
+    path = metrics.start_json_dump(str(tmp_path / 'metrics.json'), interval=0.05)
+
+    assert path == str(tmp_path / f'metrics.{os.getpid()}.json')
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with open(path) as f:
+        assert 'counters' in json.load(f)
+
+
+def test_json_dump_survives_write_errors(tmp_path):
+    missing_dir = tmp_path / 'missing'
+    metrics.start_json_dump(str(missing_dir / 'metrics.json'), interval=0.05)
+    time.sleep(0.2)
+
+    # Once the directory exists the same thread starts writing
+    missing_dir.mkdir()
+    path = missing_dir / f'metrics.{os.getpid()}.json'
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert path.exists()
@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from database import database
+from jobs import precompute_routes
+from utils import map_utils
+from utils.service_utils import CircuitBreaker
+
+
+@pytest.fixture
+def trips():
+    with database.connection() as conn:
+        conn.execute('DELETE FROM travel_history')
+        conn.executemany(
+            'INSERT INTO travel_history (user_id, start_location, end_location, travel_time, timestamp) '
+            'VALUES (1, ?, ?, 10, ?)',
+            [
+                ('Station 0', 'Station 5', '2024-01-01 02:00:00'),
+                ('Station 0', 'Station 5', '2024-01-02 02:30:00'),
+                ('Station 3', 'Station 4', '2024-01-01 02:15:00'),
+            ]
+        )
+    yield
+    with database.connection() as conn:
+        conn.execute('DELETE FROM travel_history')
+
+
+@pytest.fixture
+def india_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_popular_od_pairs_are_bucketed_by_local_hour(trips, india_time):
+    # 02:00-02:30 UTC is 07:30-08:00 in India
+    popular = database.get_popular_od_pairs(top_n=5, bucket_hours=3)
+
+    assert list(popular) == [2]
+    assert popular[2][0] == ('Station 0', 'Station 5', 2)
+
+
+def test_is_journey_cached_after_planning(services):
+    assert not map_utils.is_journey_cached('Station 0', 'Station 5')
+    map_utils.get_route('Station 0', 'Station 5')
+
+    assert map_utils.is_journey_cached('Station 0', 'Station 5')
+
+
+def test_fallback_routes_do_not_count_as_precomputed(services, tmp_path, monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    map_utils.geocode_location('Station 0')
+    map_utils.geocode_location('Station 5')
+    services.fail_status = 500
+
+    monkeypatch.setattr(precompute_routes, 'ProcessPoolExecutor', _InlineExecutor)
+    progress = tmp_path / 'progress.json'
+    tasks = [{'id': 'Bus|Station 0|Station 5', 'origin': 'Station 0', 'destination': 'Station 5',
+              'transport_mode': 'Bus'}]
+    report = precompute_routes.run(tasks, workers=1, progress_path=str(progress))
+
+    assert report['completed'] == 0
+    assert report['not_cached'] == 1
+    assert not map_utils.is_journey_cached('Station 0', 'Station 5')
+
+    services.fail_status = None
+    map_utils._breakers['ors'] = CircuitBreaker('ors')
+    report = precompute_routes.run(tasks, workers=1, progress_path=str(progress))
+
+    assert report['completed'] == 1
+    assert not progress.exists()
+
+
+def test_workers_share_host_limits(services, trips, monkeypatch):
+    monkeypatch.setenv('SMART_TRANSIT_ORS_URL', services.url)
+    monkeypatch.setenv('SMART_TRANSIT_NOMINATIM_URL', services.url)
+    tasks = precompute_routes.build_tasks(top_n=5, bucket_hours=3, hours=None, transport_mode='Bus')
+
+    report = precompute_routes.run(tasks, workers=2)
+
+    assert report['completed'] == len(tasks) == 2
+    assert report['errors'] == 0
+
+
+class _InlineExecutor:
+    """ProcessPoolExecutor stand-in running tasks in this process, sharing the test's map_utils setup"""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@pytest.mark.parametrize('value, hours', [
+    ('6-10', [6, 7, 8, 9, 10]),
+    ('7', [7]),
+    ('22-2', [22, 23, 0, 1, 2]),
+    ('23-0', [23, 0]),
+])
+def test_parse_hours(value, hours):
+    assert precompute_routes._parse_hours(value) == hours
+
+
+@pytest.mark.parametrize('value', ['24', '6-25', 'morning', '-3'])
+def test_parse_hours_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        precompute_routes._parse_hours(value)
+
+
+def test_overnight_hours_select_overnight_buckets(trips, india_time):
+    # The trips fall in the 06:00-09:00 local bucket
+    assert precompute_routes.build_tasks(5, 3, precompute_routes._parse_hours('22-2'), 'Bus') == []
+    assert len(precompute_routes.build_tasks(5, 3, precompute_routes._parse_hours('5-7'), 'Bus')) == 2
+
+
+def test_main_rejects_bad_hours(monkeypatch, capsys):
+    monkeypatch.setattr('sys.argv', ['precompute_routes', '--hours', '6-25'])
+    with pytest.raises(SystemExit) as exit_info:
+        precompute_routes.main()
+
+    assert exit_info.value.code == 2
+    assert '--hours' in capsys.readouterr().err
@@ -0,0 +1,193 @@
+import threading
+import time
+
+import pytest
+
+from utils.service_utils import CircuitBreaker, CircuitOpenError, LRUCache, SingleFlight, retry_call
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow, 21))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Let every thread join the in-flight call before it finishes
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42] * 8
+
+
+def test_single_flight_shares_errors_and_forgets_finished_calls():
+    flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: (_ for _ in ()).throw(ValueError('boom')))
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_retry_call_retries_until_success(monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError()
+        return 'ok'
+
+    assert retry_call(flaky, attempts=3) == 'ok'
+    assert len(attempts) == 3
+
+
+def test_retry_call_gives_up_after_attempts(monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        retry_call(failing, attempts=3)
+    assert len(attempts) == 3
+
+
+def test_retry_call_does_not_retry_permanent_errors():
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        retry_call(bad_request, attempts=3, retry_if=lambda e: isinstance(e, ConnectionError))
+    assert len(attempts) == 1
+
+
+def _fail():
+    raise ConnectionError()
+
+
+def test_circuit_breaker_opens_after_failures_and_fails_fast():
+    breaker = CircuitBreaker('test', failure_threshold=0.5, window=10, min_calls=4, reset_timeout=60)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+
+    assert breaker.state == 'open'
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_circuit_breaker_ignores_errors_that_are_not_failures():
+    breaker = CircuitBreaker('test', min_calls=2)
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            breaker.call(lambda: int('x'), is_failure=lambda e: isinstance(e, ConnectionError))
+
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breaker_half_open_trial_closes_on_success():
+    breaker = CircuitBreaker('test', min_calls=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breaker_half_open_trial_reopens_on_failure():
+    breaker = CircuitBreaker('test', min_calls=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == 'open'
+
+
+def test_circuit_breaker_ignores_calls_started_before_it_opened():
+    breaker = CircuitBreaker('test', min_calls=2, reset_timeout=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    slow_thread = threading.Thread(target=lambda: breaker.call(slow))
+    slow_thread.start()
+    started.wait(5)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    assert breaker.state == 'open'
+
+    # The slow call finishing is not a trial call and must not close the breaker
+    release.set()
+    slow_thread.join(5)
+    assert breaker.state == 'open'
+
+
+def test_circuit_breaker_late_failure_does_not_extend_open_period():
+    breaker = CircuitBreaker('test', min_calls=2, reset_timeout=0.2)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_failure():
+        started.set()
+        release.wait(5)
+        raise ConnectionError()
+
+    def run_slow():
+        with pytest.raises(ConnectionError):
+            breaker.call(slow_failure)
+
+    slow_thread = threading.Thread(target=run_slow)
+    slow_thread.start()
+    started.wait(5)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    time.sleep(0.1)
+    release.set()
+    slow_thread.join(5)
+
+    # Still half-open on the original schedule
+    time.sleep(0.12)
+    assert breaker.state == 'half-open'
@@ -0,0 +1,119 @@
+import os
+import sys
+
+import pytest
+
+from utils import voice_utils
+
+
+@pytest.fixture
+def audio_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(voice_utils, 'AUDIO_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_synthesize_speech_caches_by_content(audio_cache, monkeypatch):
+    calls = []
+
+    def fake_tts(text, lang, path):
+        calls.append(text)
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+
+    monkeypatch.setitem(voice_utils._backends, 'fake', (fake_tts, '.mp3'))
+    first = voice_utils.synthesize_speech("Turn left", backend='fake')
+    second = voice_utils.synthesize_speech("Turn left", backend='fake')
+
+    assert first == second
+    assert calls == ["Turn left"]
+
+
+def test_failed_synthesis_leaves_no_temp_file(audio_cache, monkeypatch):
+    def broken_tts(text, lang, path):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        raise RuntimeError("synthesis failed")
+
+    monkeypatch.setitem(voice_utils._backends, 'broken', (broken_tts, '.mp3'))
+    with pytest.raises(RuntimeError):
+        voice_utils.synthesize_speech("Turn right", backend='broken')
+
+    assert os.listdir(audio_cache) == []
+
+
+def test_text_to_speech_reports_unavailable_audio(monkeypatch):
+    # No audio device: pygame cannot be imported
+    monkeypatch.setitem(sys.modules, 'pygame', None)
+    monkeypatch.setattr(voice_utils, '_playback_unavailable', False)
+    monkeypatch.setattr(voice_utils, '_playback_thread', None)
+
+    voice_utils.text_to_speech("Continue straight")
+    voice_utils._playback_thread.join(5)
+
+    assert voice_utils._playback_queue.empty()
+    assert voice_utils.text_to_speech("Continue straight") is False
+    assert voice_utils._playback_thread is not None and not voice_utils._playback_thread.is_alive()
+
+
+def test_common_phrases_cover_route_steps():
+    from agents.route_agent import RouteAgent
+
+    route = RouteAgent()._enhance_route_data({}, "Andheri", "Bandra", 0)
+    placeless = [step for step in route['steps'] if "Andheri" not in step and "Bandra" not in step]
+
+    assert placeless
+    assert set(placeless) <= set(voice_utils.COMMON_PHRASES)
+
+
+def test_playback_start_prerenders_common_phrases(audio_cache, monkeypatch):
+    import types
+
+    def fake_tts(text, lang, path):
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+
+    music = types.SimpleNamespace(load=lambda path: None, play=lambda: None, get_busy=lambda: False)
+    pygame = types.SimpleNamespace(mixer=types.SimpleNamespace(init=lambda: None, music=music))
+    monkeypatch.setitem(sys.modules, 'pygame', pygame)
+    monkeypatch.setitem(voice_utils._backends, 'fake', (fake_tts, '.mp3'))
+    monkeypatch.setattr(voice_utils, 'TTS_BACKEND', 'fake')
+    monkeypatch.setattr(voice_utils, '_playback_unavailable', False)
+    monkeypatch.setattr(voice_utils, '_playback_thread', None)
+    monkeypatch.setattr(voice_utils, '_prerender_started', False)
+
+    started = []
+    monkeypatch.setattr(voice_utils.threading, 'Thread', _recording_thread(started))
+    assert voice_utils.text_to_speech("Turn left") is True
+    voice_utils._playback_queue.join()
+    prerender = next(t for t in started if t.name == 'voice-prerender')
+    prerender.join(10)
+
+    for phrase in voice_utils.COMMON_PHRASES:
+        assert os.path.exists(voice_utils._cache_path(phrase, 'en', 'fake'))
+
+
+def _recording_thread(started):
+    import threading
+
+    class RecordingThread(threading.Thread):
+        def start(self):
+            started.append(self)
+            super().start()
+
+    return RecordingThread
+
+
+def test_prerender_command_line(audio_cache, monkeypatch, capsys):
+    rendered = []
+
+    def fake_tts(text, lang, path):
+        rendered.append((text, lang))
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+
+    monkeypatch.setitem(voice_utils._backends, 'fake', (fake_tts, '.mp3'))
+    monkeypatch.setattr(sys, 'argv', ['voice_utils', '--prerender', '--backend', 'fake', '--lang', 'hi'])
+    voice_utils.main()
+
+    assert sorted(rendered) == sorted((phrase, 'hi') for phrase in voice_utils.COMMON_PHRASES)
+    assert f"Cached {len(rendered)} of {len(rendered)}" in capsys.readouterr().out
@@ -1,13 +1,244 @@
-def send_alert(message, alert_type="info"):
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from utils import metrics
+
+# Lower value = delivered first
+ALERT_PRIORITIES = {
+    'sos': 0,
+    'safety': 1,
+    'delay': 2,
+    'congestion': 3,
+    'info': 4,
+}
+
+# Identical alerts for the same user and route within this window are coalesced
+DEDUP_WINDOW_SECONDS = 60
+
+# Optional endpoint for the webhook channel
+ALERT_WEBHOOK_URL = os.environ.get('SMART_TRANSIT_ALERT_WEBHOOK')
+
+
+# Longest a caller waits, across all channels, for queue room for an SOS alert
+SOS_ENQUEUE_TIMEOUT = 1.0
+
+
+def _push_channel(alerts):
+    # Stand-in for push notifications: print to console, the UI shows the returned alert
+    for alert in alerts:
+        print(f"ALERT ({alert['type']}): {alert['message']}")
+
+
+def _sms_channel(alerts):
+    # Stand-in for an SMS gateway's bulk send; only urgent alerts go out by SMS
+    for alert in alerts:
+        if alert['type'] in ('sos', 'safety'):
+            print(f"SMS to user {alert['user_id']}: {alert['message']}")
+
+
+def _webhook_channel(alerts):
+    if ALERT_WEBHOOK_URL:
+        import requests
+        # One POST per batch instead of one per alert
+        requests.post(ALERT_WEBHOOK_URL, json=alerts, timeout=5)
+
+
+# name -> (deliver(list of alerts), worker threads, max alerts per batch)
+DEFAULT_CHANNELS = {
+    'push': (_push_channel, 4, 50),
+    'sms': (_sms_channel, 2, 20),
+    'webhook': (_webhook_channel, 4, 50),
+}
+
+
+class AlertDispatcher:
+    """Fan alerts out to per-channel worker pools, most urgent first, with duplicate coalescing
+
+    Each worker takes the most urgent queued alert plus whatever else is already
+    waiting (up to the channel's batch size) and delivers them in one call.
+    """
+
+    def __init__(self, channels=None, queue_size=1000, dedup_window=DEDUP_WINDOW_SECONDS):
+        self.channels = dict(channels or DEFAULT_CHANNELS)
+        self.dedup_window = dedup_window
+        self._queues = {name: queue.PriorityQueue(maxsize=queue_size) for name in self.channels}
+        self._sequence = itertools.count()
+        self._recent = {}
+        self._recent_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies = {name: deque(maxlen=1000) for name in self.channels}
+        self._batch_sizes = {name: deque(maxlen=1000) for name in self.channels}
+        self._counts = {'submitted': 0, 'coalesced': 0, 'dropped': 0, 'delivered': 0, 'failed': 0}
+        # Held while checking for room and enqueueing, so an alert goes to every channel or none;
+        # workers notify it when they free up room
+        self._room = threading.Condition()
+        self._threads = []
+
+        for name, (deliver, workers, batch_size) in self.channels.items():
+            for i in range(workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(name, deliver, batch_size), name=f'alerts-{name}-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _dedup_key(self, alert):
+        return (alert['user_id'], alert['route_id'], alert['type'], alert['message'])
+
+    def _claim(self, alert):
+        """Reserve the alert's dedup slot; returns a token for _release, or None for a duplicate"""
+        # SOS alerts are never coalesced
+        if alert['type'] == 'sos':
+            return ()
+        key = self._dedup_key(alert)
+        now = time.monotonic()
+        with self._recent_lock:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedup_window:
+                return None
+            self._recent[key] = now
+            # Drop expired keys once the table grows
+            if len(self._recent) > 10000:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+        return (key, now)
+
+    def _release(self, token):
+        """Undo a claim, so a retry of a dropped alert is not coalesced away"""
+        if not token:
+            return
+        key, claimed_at = token
+        with self._recent_lock:
+            if self._recent.get(key) == claimed_at:
+                del self._recent[key]
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self._counts[name] += value
+
+    def submit(self, alert):
+        """Queue an alert on every channel; returns False if it was coalesced or dropped"""
+        self._count('submitted')
+        token = self._claim(alert)
+        if token is None:
+            self._count('coalesced')
+            metrics.increment('alerts_coalesced_total', type=alert['type'])
+            return False
+
+        priority = ALERT_PRIORITIES.get(alert['type'], ALERT_PRIORITIES['info'])
+        item = (priority, next(self._sequence), time.monotonic(), alert)
+        # One deadline for all channels, so an SOS blocks its caller for at most SOS_ENQUEUE_TIMEOUT
+        deadline = time.monotonic() + SOS_ENQUEUE_TIMEOUT
+        with self._room:
+            # Only submit() adds to the queues, so channels with room now still have it below.
+            # Enqueueing on some channels and then dropping would make a retry deliver twice.
+            full = [name for name, channel_queue in self._queues.items() if channel_queue.full()]
+            while full and alert['type'] == 'sos':
+                # Wait briefly for room rather than lose an SOS
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._room.wait(remaining)
+                full = [name for name, channel_queue in self._queues.items() if channel_queue.full()]
+            if not full:
+                for channel_queue in self._queues.values():
+                    channel_queue.put_nowait(item)
+                return True
+
+        self._count('dropped')
+        for name in full:
+            metrics.increment('alerts_dropped_total', channel=name, type=alert['type'])
+        self._release(token)
+        return False
+
+    def _worker(self, name, deliver, batch_size):
+        channel_queue = self._queues[name]
+        while True:
+            # Block for the next alert, then take whatever else is already waiting
+            items = [channel_queue.get()]
+            while len(items) < batch_size:
+                try:
+                    items.append(channel_queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._room:
+                self._room.notify_all()
+            try:
+                deliver([alert for _, _, _, alert in items])
+                now = time.monotonic()
+                latencies = [now - queued_at for _, _, queued_at, _ in items]
+                with self._stats_lock:
+                    self._latencies[name].extend(latencies)
+                    self._batch_sizes[name].append(len(items))
+                    self._counts['delivered'] += len(items)
+                for latency in latencies:
+                    metrics.observe('alert_delivery_seconds', latency, channel=name)
+            except Exception as e:
+                print(f"Error delivering alerts via {name}: {e}")
+                self._count('failed', len(items))
+                metrics.increment('alert_failures_total', len(items), channel=name)
+            finally:
+                for _ in items:
+                    channel_queue.task_done()
+
+    def join(self):
+        """Block until every queued alert has been handled"""
+        for channel_queue in self._queues.values():
+            channel_queue.join()
+
+    def stats(self):
+        """Delivery counts and per-channel latency percentiles (ms) over recent alerts"""
+        with self._stats_lock:
+            counts = dict(self._counts)
+            latencies = {name: list(values) for name, values in self._latencies.items()}
+            batch_sizes = {name: list(values) for name, values in self._batch_sizes.items()}
+
+        channels = {}
+        for name, values in latencies.items():
+            channels[name] = {'queued': self._queues[name].qsize(), 'delivered_recent': len(values)}
+            if batch_sizes[name]:
+                channels[name]['mean_batch_size'] = float(np.mean(batch_sizes[name]))
+            if values:
+                ms = np.asarray(values) * 1000
+                channels[name].update({
+                    'p50_ms': float(np.percentile(ms, 50)),
+                    'p95_ms': float(np.percentile(ms, 95)),
+                    'max_ms': float(ms.max()),
+                })
+        return {'counts': counts, 'channels': channels}
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Process-wide dispatcher, started on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+        return _dispatcher
+
+
+def send_alert(message, alert_type="info", user_id=1, route_id=None):
     """Send an alert to the user"""
-    # In a real implementation, this would send push notifications, SMS, etc.
-    # For now, we'll just print to console and show in the UI
-    
-    print(f"ALERT ({alert_type}): {message}")
-    
-    # Return the alert for display in the UI
-    return {
+    alert = {
         "type": alert_type,
         "message": message,
+        "user_id": user_id,
+        "route_id": route_id,
         "timestamp": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+
+    # Delivery happens on the dispatcher's worker threads, so the caller never waits on a channel
+    queued = get_dispatcher().submit(alert)
+
+    # Return the alert for display in the UI
+    return {**alert, "queued": queued}
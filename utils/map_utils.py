@@ -1,107 +1,341 @@
-import openrouteservice
-import requests
+import json
+import os
+import threading
+import time
 import numpy as np
-from geopy.geocoders import Nominatim
 from datetime import datetime
+from utils.service_utils import SingleFlight, LRUCache, CircuitBreaker, retry_call
+from utils import metrics
+from database.database import get_cached_value, set_cached_value
 
 # CHANGE REQUIRED: Add your OpenRouteService API key here
 # You can get a free API key from https://openrouteservice.org/
 ORS_API_KEY = "eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZjYyNDgiLCJpZCI6ImM0ODUzMzhjMTBiMjQ3Nzk5MTU0NzdlZjEyMWQ1ZGFkIiwiaCI6Im11cm11cjY0In0="
 
-# Initialize OpenRouteService client
-client = openrouteservice.Client(key=ORS_API_KEY)
+# Upstream endpoints, overridable to point at a local stand-in (see benchmarks/fake_services.py)
+ORS_BASE_URL = os.environ.get('SMART_TRANSIT_ORS_URL', 'https://api.openrouteservice.org')
+NOMINATIM_URL = os.environ.get('SMART_TRANSIT_NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+
+# Upstream timeouts (seconds)
+ORS_TIMEOUT = 10
+GEOCODER_TIMEOUT = 5
+# How long the ORS client keeps retrying 503s on its own before raising a Timeout.
+# Must stay well below ORS_TIMEOUT: retry_call and the circuit breaker do the real retrying.
+ORS_RETRY_TIMEOUT = 1
+
+# OpenRouteService client and geocoder, created on first use by get_client()/get_geolocator()
+# so importing this module does not load openrouteservice, geopy or requests
+client = None
+geolocator = None
+_clients_lock = threading.Lock()
+
+# Per-host concurrency limits (Nominatim's usage policy allows very little parallelism).
+# Multi-process jobs replace these with process-shared semaphores of the same size.
+HOST_LIMITS = {'ors': 8, 'nominatim': 2}
+_host_limits = {host: threading.BoundedSemaphore(limit) for host, limit in HOST_LIMITS.items()}
+
+# Circuit breakers fail fast while an upstream is down instead of waiting on timeouts
+_breakers = {
+    'ors': CircuitBreaker('ors'),
+    'nominatim': CircuitBreaker('nominatim'),
+}
+
+# Identical in-flight geocode/route requests share one upstream call
+_inflight = SingleFlight()
+_geocode_cache = LRUCache(maxsize=2048)
+# Cache miss marker, since None is a valid (not found) geocode result
+_MISSING = object()
+
+# Shared generator for simulated data; pass an explicit rng for reproducible runs
+_rng = np.random.default_rng()
+
+# Routes per (profile, coordinates) as (fetched_at, route). Fresh entries are served
+# directly; older ones only while ORS is unavailable
+_route_cache = LRUCache(maxsize=512)
+
+# How long shared cache entries (SQLite upstream_cache table) are served without
+# asking the upstream again. The precompute job warms this cache ahead of peak hours.
+ROUTE_CACHE_TTL = 12 * 3600
+GEOCODE_CACHE_TTL = 30 * 24 * 3600
+
+# Average speeds (km/h) and detour factor for the straight-line fallback estimate
+PROFILE_SPEEDS = {
+    'driving-car': 25.0,
+    'cycling-regular': 15.0,
+    'foot-walking': 5.0,
+}
+DETOUR_FACTOR = 1.3
+
+# Map rendering: simplification tolerance in screen pixels, and colors for route alternatives
+SIMPLIFY_PIXELS = 1.0
+ROUTE_COLORS = ['blue', 'purple', 'orange']
+
+
+def get_client():
+    """Shared OpenRouteService client"""
+    global client
+    if client is None:
+        with _clients_lock:
+            if client is None:
+                import openrouteservice
+                # The client keeps one requests.Session, so connections to ORS are pooled and kept
+                # alive. Over-query-limit and 503 retries are handled by retry_call below instead of
+                # the client's own 60 second retry loop.
+                client = openrouteservice.Client(
+                    key=ORS_API_KEY,
+                    base_url=ORS_BASE_URL,
+                    timeout=ORS_TIMEOUT,
+                    retry_timeout=ORS_RETRY_TIMEOUT,
+                    retry_over_query_limit=False
+                )
+    return client
+
+
+def get_geolocator():
+    """Shared geocoder, reused so its HTTP session stays alive between calls"""
+    global geolocator
+    if geolocator is None:
+        with _clients_lock:
+            if geolocator is None:
+                from urllib.parse import urlsplit
+                from geopy.geocoders import Nominatim
+                url = urlsplit(NOMINATIM_URL)
+                geolocator = Nominatim(
+                    user_agent="smart_transit_ai",
+                    timeout=GEOCODER_TIMEOUT,
+                    domain=url.netloc + url.path.rstrip('/'),
+                    scheme=url.scheme
+                )
+    return geolocator
+
+
+def _is_retriable(error):
+    """Only retry transient upstream failures, not bad requests"""
+    # Only reached on errors, by which point the client libraries are loaded
+    import requests
+    from openrouteservice import exceptions as ors_exceptions
+    from geopy import exc as geopy_exceptions
+    
+    if isinstance(error, (ors_exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, ors_exceptions.ApiError):
+        return error.status == 429 or (error.status or 0) >= 500
+    return isinstance(error, (
+        geopy_exceptions.GeocoderTimedOut,
+        geopy_exceptions.GeocoderUnavailable,
+        geopy_exceptions.GeocoderRateLimited,
+    ))
+
+
+def _call_upstream(host, fn, **kwargs):
+    """Call an upstream service through its breaker and host limit, retrying transient errors"""
+    def limited_call():
+        with _host_limits[host]:
+            return fn(**kwargs)
+    try:
+        with metrics.span('upstream_request_seconds', host=host):
+            return _breakers[host].call(
+                retry_call, limited_call, retry_if=_is_retriable, is_failure=_is_retriable
+            )
+    except Exception as e:
+        metrics.increment('upstream_failures_total', host=host, error=type(e).__name__)
+        raise
+
+
+def _fallback_coordinates(location_name):
+    """Return coordinates for a well-known location when geocoding is unavailable"""
+    if "mumbai" in location_name.lower():
+        return (72.8777, 19.0760)  # Mumbai coordinates
+    elif "delhi" in location_name.lower():
+        return (77.1025, 28.7041)  # Delhi coordinates
+    elif "bangalore" in location_name.lower():
+        return (77.5946, 12.9716)  # Bangalore coordinates
+    else:
+        return (77.2090, 28.6139)  # Default to New Delhi
+
+
+def _geocode_upstream(location_name):
+    location = _call_upstream('nominatim', get_geolocator().geocode, query=location_name)
+    if location:
+        return (location.longitude, location.latitude)
+    return None
+
+
+def _load_shared(namespace, key):
+    """Entry from the shared SQLite cache as (value, created_at), or None"""
+    try:
+        return get_cached_value(namespace, key)
+    except Exception as e:
+        print(f"Error reading {namespace} cache: {e}")
+        return None
+
+
+def _store_shared(namespace, key, value):
+    try:
+        set_cached_value(namespace, key, value)
+    except Exception as e:
+        print(f"Error writing {namespace} cache: {e}")
+
 
 def geocode_location(location_name):
     """Convert location name to coordinates"""
-    geolocator = Nominatim(user_agent="smart_transit_ai")
+    key = location_name.strip().lower()
+    # A single get, so an eviction between a membership test and the read cannot return None
+    coords = _geocode_cache.get(key, _MISSING)
+    if coords is not _MISSING:
+        metrics.increment('cache_hits_total', cache='geocode')
+        return coords
+    
+    shared = _load_shared('geocode', key)
+    if shared is not None and time.time() - shared[1] < GEOCODE_CACHE_TTL:
+        metrics.increment('cache_hits_total', cache='geocode_shared')
+        coords = tuple(shared[0]) if shared[0] else None
+        _geocode_cache.set(key, coords)
+        return coords
+    metrics.increment('cache_misses_total', cache='geocode')
+
     try:
-        location = geolocator.geocode(location_name)
-        if location:
-            return (location.longitude, location.latitude)
-        else:
-            return None
+        with metrics.span('stage_seconds', stage='geocode'):
+            coords = _inflight.do(('geocode', key), _geocode_upstream, location_name)
     except:
-        # Fallback: return coordinates for a well-known location
-        if "mumbai" in location_name.lower():
-            return (72.8777, 19.0760)  # Mumbai coordinates
-        elif "delhi" in location_name.lower():
-            return (77.1025, 28.7041)  # Delhi coordinates
-        elif "bangalore" in location_name.lower():
-            return (77.5946, 12.9716)  # Bangalore coordinates
-        else:
-            return (77.2090, 28.6139)  # Default to New Delhi
+        # Fallback results are not cached so the next request retries the geocoder
+        return _fallback_coordinates(location_name)
+
+    _geocode_cache.set(key, coords)
+    _store_shared('geocode', key, coords)
+    return coords
+
+
+def is_journey_cached(start, end, profile='driving-car'):
+    """Whether the shared cache holds fresh geocodes and a fresh route for this journey"""
+    now = time.time()
+    coordinates = []
+    for name in (start, end):
+        shared = _load_shared('geocode', name.strip().lower())
+        if shared is None or not shared[0] or now - shared[1] >= GEOCODE_CACHE_TTL:
+            return False
+        coordinates.append(tuple(shared[0]))
+    shared = _load_shared('route', json.dumps(_route_key(coordinates, profile)))
+    return shared is not None and now - shared[1] < ROUTE_CACHE_TTL
+
+
+def _route_key(coordinates, profile):
+    # Round to ~10 m so repeated geocodes of the same place share a cache entry
+    return (profile, tuple((round(c[0], 4), round(c[1], 4)) for c in coordinates))
+
+
+def _cached_route(key, max_age=None):
+    """Route for key from the in-memory or shared cache, ignoring entries older than max_age"""
+    entry = _route_cache.get(key)
+    if entry is None:
+        shared = _load_shared('route', json.dumps(key))
+        if shared is not None:
+            entry = (shared[1], shared[0])
+            _route_cache.set(key, entry)
+    if entry is None:
+        return None
+    if max_age is not None and time.time() - entry[0] > max_age:
+        return None
+    return entry[1]
+
+
+def _directions(coordinates, profile):
+    """Fetch directions, sharing the upstream call with identical in-flight requests"""
+    key = _route_key(coordinates, profile)
+    cached = _cached_route(key, ROUTE_CACHE_TTL)
+    if cached is not None:
+        metrics.increment('cache_hits_total', cache='route')
+        return cached
+    metrics.increment('cache_misses_total', cache='route')
+    
+    with metrics.span('stage_seconds', stage='directions'):
+        route = _inflight.do(
+            key,
+            _call_upstream,
+            'ors',
+            get_client().directions,
+            coordinates=coordinates,
+            profile=profile,
+            format='geojson'
+        )
+    _route_cache.set(key, (time.time(), route))
+    _store_shared('route', json.dumps(key), route)
+    return route
+
 
 def get_route(start, end, profile='driving-car'):
     """Get route between two points"""
+    # Geocode start and end points
+    start_coords = geocode_location(start)
+    end_coords = geocode_location(end)
+    
+    if not start_coords or not end_coords:
+        return None
+    
+    coordinates = [start_coords, end_coords]
     try:
-        # Geocode start and end points
-        start_coords = geocode_location(start)
-        end_coords = geocode_location(end)
-        
-        if not start_coords or not end_coords:
-            return None
-        
         # Get route
-        route = client.directions(
-            coordinates=[start_coords, end_coords],
-            profile=profile,
-            format='geojson'
-        )
-        
-        return route
+        return _directions(coordinates, profile)
     except Exception as e:
         print(f"Error getting route: {e}")
-        # Return a mock route for demonstration
-        return create_mock_route(start, end)
+        # Serve the last good route, or an estimate from the already geocoded endpoints
+        cached = _cached_route(_route_key(coordinates, profile))
+        if cached is not None:
+            metrics.increment('route_fallbacks_total', source='cache')
+            return cached
+        metrics.increment('route_fallbacks_total', source='estimate')
+        return create_mock_route(start_coords, end_coords, profile)
 
 def get_route_with_waypoints(coordinates, profile='driving-car'):
     """Get route with multiple waypoints"""
     try:
-        route = client.directions(
-            coordinates=coordinates,
-            profile=profile,
-            format='geojson'
-        )
+        route = _directions(coordinates, profile)
         
         return route
     except Exception as e:
         print(f"Error getting route with waypoints: {e}")
-        return None
+        return _cached_route(_route_key(coordinates, profile))
 
-def get_crowd_data(location, radius=500):
-    """Get crowd data for a location (simulated)"""
+def get_crowd_levels(locations, hour=None, rng=None):
+    """Get simulated crowd levels for many locations in one vectorized draw"""
     # In a real implementation, this would use actual data sources
     # For now, we'll simulate based on time of day and location type
+    rng = _rng if rng is None else rng
+    if hour is None:
+        hour = datetime.now().hour
     
-    hour = datetime.now().hour
+    is_hub = np.array(['station' in l.lower() or 'central' in l.lower() for l in locations], dtype=bool)
     
-    # Simulate crowd levels based on time and location type
-    if 'station' in location.lower() or 'central' in location.lower():
-        # Transportation hubs are busy during rush hours
-        if 7 <= hour <= 10 or 17 <= hour <= 19:
-            crowd_level = np.random.randint(7, 10)
-        else:
-            crowd_level = np.random.randint(4, 7)
+    # Transportation hubs are busy during rush hours; other locations have more variation
+    if 7 <= hour <= 10 or 17 <= hour <= 19:
+        low, high = np.where(is_hub, 7, 3), np.where(is_hub, 10, 8)
     else:
-        # Other locations have more variation
-        crowd_level = np.random.randint(3, 8)
+        low, high = np.where(is_hub, 4, 3), np.where(is_hub, 7, 8)
     
-    return crowd_level
+    return rng.integers(low, high)
 
-def create_mock_route(start, end):
-    """Create a mock route for demonstration when API is not available"""
-    # Generate some coordinates between start and end
-    start_coords = geocode_location(start)
-    end_coords = geocode_location(end)
-    
+def get_crowd_data(location, radius=500, rng=None):
+    """Get crowd data for a location (simulated)"""
+    return int(get_crowd_levels([location], rng=rng)[0])
+
+def _haversine_km(start_coords, end_coords):
+    """Great-circle distance between two (lng, lat) points in km"""
+    lng1, lat1, lng2, lat2 = np.radians([start_coords[0], start_coords[1], end_coords[0], end_coords[1]])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+def create_mock_route(start_coords, end_coords, profile='driving-car'):
+    """Create an estimated route when the routing API is not available"""
     # Create a simple straight line with a few points
     num_points = 10
-    coordinates = []
+    t = np.linspace(0, 1, num_points)[:, None]
+    start = np.asarray(start_coords, dtype=float)
+    end = np.asarray(end_coords, dtype=float)
+    coordinates = (start + (end - start) * t).tolist()
     
-    for i in range(num_points):
-        lat = start_coords[1] + (end_coords[1] - start_coords[1]) * (i / (num_points - 1))
-        lng = start_coords[0] + (end_coords[0] - start_coords[0]) * (i / (num_points - 1))
-        coordinates.append([lng, lat])
+    # Estimate road distance and travel time from the straight-line distance
+    distance_km = _haversine_km(start_coords, end_coords) * DETOUR_FACTOR
+    speed = PROFILE_SPEEDS.get(profile, PROFILE_SPEEDS['driving-car'])
     
     return {
         'type': 'FeatureCollection',
@@ -111,8 +345,8 @@ def create_mock_route(start, end):
                 'properties': {
                     'segments': [
                         {
-                            'distance': 5000,  # 5km
-                            'duration': 1200   # 20 minutes
+                            'distance': float(distance_km * 1000),
+                            'duration': float(distance_km / speed * 3600)
                         }
                     ]
                 },
@@ -123,3 +357,86 @@ def create_mock_route(start, end):
             }
         ]
     }
+
+
+def simplify_coordinates(coords, tolerance):
+    """Simplify a line with Douglas-Peucker; tolerance is in coordinate units (degrees)"""
+    points = np.asarray(coords, dtype=float)
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    
+    # Iterative instead of recursive so long routes cannot hit the recursion limit
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        
+        start = points[first]
+        segment = points[last] - start
+        offsets = points[first + 1:last] - start
+        seg_len = np.hypot(segment[0], segment[1])
+        
+        # Perpendicular distance of every inner point to the segment in one pass
+        if seg_len == 0:
+            dists = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            dists = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / seg_len
+        
+        idx = int(np.argmax(dists))
+        if dists[idx] > tolerance:
+            split = first + 1 + idx
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    
+    return points[keep]
+
+def simplify_for_zoom(coords, zoom):
+    """Simplify a line so no detail smaller than SIMPLIFY_PIXELS is kept at the given zoom level"""
+    # Web Mercator tiles are 256 px wide and cover 360 degrees at zoom 0
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    return simplify_coordinates(coords, SIMPLIFY_PIXELS * degrees_per_pixel)
+
+def build_route_map(routes, selected_index=0, zoom_start=12):
+    """Draw all route alternatives on one map, with the selected route on top"""
+    import folium
+    
+    # Keep a little extra detail for zooming in past the initial view
+    detail_zoom = zoom_start + 2
+    selected = routes[selected_index]
+    start_coords = selected.coords[0]
+    end_coords = selected.coords[-1]
+    
+    m = folium.Map(location=[start_coords[1], start_coords[0]], zoom_start=zoom_start)
+    
+    order = [i for i in range(len(routes)) if i != selected_index] + [selected_index]
+    for i in order:
+        points = simplify_for_zoom(routes[i].coords, detail_zoom)
+        is_selected = i == selected_index
+        folium.PolyLine(
+            locations=points[:, ::-1].tolist(),
+            color=ROUTE_COLORS[i % len(ROUTE_COLORS)],
+            weight=6 if is_selected else 4,
+            opacity=0.8 if is_selected else 0.5,
+            tooltip=f"Route {i+1}"
+        ).add_to(m)
+    
+    # Add markers for start and end
+    folium.Marker(
+        [start_coords[1], start_coords[0]],
+        popup="Start",
+        icon=folium.Icon(color='green', icon='play')
+    ).add_to(m)
+    
+    folium.Marker(
+        [end_coords[1], end_coords[0]],
+        popup="End",
+        icon=folium.Icon(color='red', icon='stop')
+    ).add_to(m)
+    
+    return m
@@ -0,0 +1,202 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Lightweight in-process metrics: timing spans, counters and latency histograms.
+# Disabled unless SMART_TRANSIT_METRICS=1 (or enable() is called); when disabled
+# span() returns a shared no-op context manager, so instrumented code pays almost nothing.
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get('SMART_TRANSIT_METRICS', '').lower() in ('1', 'true', 'yes')
+# Optional file that start_json_dump() writes snapshots to, one per process (pid added to the name)
+DUMP_PATH = os.environ.get('SMART_TRANSIT_METRICS_DUMP')
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def increment(name, value=1, **labels):
+    """Add value to a counter"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(key, seconds):
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            # Per-bucket counts (last slot is +Inf), sum, count
+            hist = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect_left(BUCKETS, seconds)] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in seconds in a histogram"""
+    if _enabled:
+        _observe(_key(name, labels), seconds)
+
+
+class _Span:
+    __slots__ = ('key', 'start')
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **labels):
+    """Time a block into the histogram `name`: with span('directions'): ..."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(_key(name, labels))
+
+
+def timed(name, **labels):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def snapshot():
+    """Current counters and histograms as a JSON-serializable dict"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+
+    return {
+        'timestamp': time.time(),
+        'counters': [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        'histograms': [
+            {
+                'name': name,
+                'labels': dict(labels),
+                'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], buckets)),
+                'sum': total,
+                'count': count,
+            }
+            for (name, labels), (buckets, total, count) in sorted(histograms.items())
+        ],
+    }
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f'# TYPE {name} counter')
+            seen.add(name)
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), (buckets, total, count) in histograms:
+        if name not in seen:
+            lines.append(f'# TYPE {name} histogram')
+            seen.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(list(BUCKETS) + ['+Inf'], buckets):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", bound))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def start_json_dump(path, interval=60.0):
+    """Write a JSON snapshot every interval seconds from a daemon thread; returns the file path
+
+    The process id is added to the file name (metrics.json -> metrics.1234.json) so
+    several server workers sharing one setting do not overwrite each other.
+    """
+    root, ext = os.path.splitext(path)
+    path = f'{root}.{os.getpid()}{ext}'
+
+    def dump_loop():
+        while True:
+            time.sleep(interval)
+            tmp_path = f'{path}.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(snapshot(), f)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                # Keep dumping; a failed write must not stop the thread
+                print(f"Error writing metrics snapshot to {path}: {e}")
+
+    thread = threading.Thread(target=dump_loop, name='metrics-dump', daemon=True)
+    thread.start()
+    return path
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so concurrent callers share one upstream request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per key; callers arriving while it runs wait for the same result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+
+class LRUCache:
+    """Small thread-safe LRU cache for upstream results"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def retry_call(fn, *args, attempts=3, base_delay=0.25, max_delay=2.0, retry_if=None, **kwargs):
+    """Call fn, retrying failures with exponential backoff and full jitter"""
+    for attempt in range(attempts):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            last_attempt = attempt == attempts - 1
+            if last_attempt or (retry_if is not None and not retry_if(e)):
+                raise
+            # Full jitter keeps retrying threads from hitting the upstream in lockstep
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(random.uniform(0, delay))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fail fast once an upstream's recent error rate trips the breaker"""
+
+    def __init__(self, name, failure_threshold=0.5, window=20, min_calls=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._outcomes = []
+        self._opened_at = None
+        self._trial_in_flight = False
+        # Bumped whenever the breaker opens or closes; results of calls started in an
+        # earlier generation are ignored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Reject the call while open; let a single trial call through when half-open.
+
+        Returns a token to pass to record_success/record_failure.
+        """
+        with self._lock:
+            state = self._state()
+            if state == 'open' or (state == 'half-open' and self._trial_in_flight):
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            trial = state == 'half-open'
+            if trial:
+                self._trial_in_flight = True
+            return (self._generation, trial)
+
+    def record_success(self, token):
+        with self._lock:
+            generation, trial = token
+            if trial:
+                # Trial call succeeded, start again with a clean window
+                self._opened_at = None
+                self._outcomes = []
+                self._trial_in_flight = False
+                self._generation += 1
+            elif generation == self._generation and self._opened_at is None:
+                self._record(True)
+            # Otherwise the call started before the breaker opened; its result is stale
+
+    def record_failure(self, token):
+        with self._lock:
+            generation, trial = token
+            if trial:
+                # Trial call failed, stay open for another reset period
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                return
+            if generation != self._generation or self._opened_at is not None:
+                return
+            self._record(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._generation += 1
+
+    def _record(self, success):
+        self._outcomes.append(success)
+        if len(self._outcomes) > self.window:
+            del self._outcomes[0]
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """Call fn through the breaker; is_failure decides which errors count against it"""
+        token = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure(token)
+            else:
+                self.record_success(token)
+            raise
+        self.record_success(token)
+        return result
@@ -1,36 +1,225 @@
-from gtts import gTTS
-import pygame
-import io
-import tempfile
+import hashlib
 import os
+import queue
+import tempfile
+import threading
+from models.route import FIRST_LINES, TRANSFER_LINES, STEP_TEMPLATES
+from utils.service_utils import SingleFlight
+
+# Synthesized phrases are cached on disk by content hash, so repeated guidance
+# (turn instructions, line numbers) is only synthesized once
+AUDIO_CACHE_DIR = os.environ.get(
+    'SMART_TRANSIT_AUDIO_CACHE',
+    os.path.join(tempfile.gettempdir(), 'smart_transit_audio')
+)
+AUDIO_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Text-to-speech backend used when none is given ('gtts' needs network, 'pyttsx3' is offline)
+TTS_BACKEND = os.environ.get('SMART_TRANSIT_TTS_BACKEND', 'gtts')
+
+# Instructions worth rendering ahead of time: every route step that does not name a
+# place, for every bus line the planner can pick, plus generic guidance
+_LINE_STEPS = [template for template in STEP_TEMPLATES if '{origin}' not in template and '{destination}' not in template]
+COMMON_PHRASES = sorted({
+    template.format(first_line=first_line, transfer_line=transfer_line)
+    for template in _LINE_STEPS
+    for first_line in FIRST_LINES
+    for transfer_line in TRANSFER_LINES
+}) + ["Turn left", "Turn right", "Continue straight", "You have arrived at your destination"]
+
+_synthesis = SingleFlight()
+_cache_lock = threading.Lock()
+_playback_queue = queue.Queue(maxsize=32)
+_playback_thread = None
+_playback_lock = threading.Lock()
+_prerender_started = False
+# Set once the audio device fails to initialize (e.g. a headless server)
+_playback_unavailable = False
+
+
+def _gtts_synthesize(text, lang, path):
+    from gtts import gTTS
+    gTTS(text=text, lang=lang, slow=False).save(path)
+
+
+def _pyttsx3_synthesize(text, lang, path):
+    # Offline engine; it uses the system voice, so lang only affects the cache key
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    engine.save_to_file(text, path)
+    engine.runAndWait()
+
 
-def text_to_speech(text, lang='en'):
-    """Convert text to speech and play it"""
+# name -> (synthesize(text, lang, path), file suffix)
+_backends = {
+    'gtts': (_gtts_synthesize, '.mp3'),
+    'pyttsx3': (_pyttsx3_synthesize, '.wav'),
+}
+
+
+def register_tts_backend(name, synthesize, suffix='.mp3'):
+    """Add a text-to-speech backend; synthesize(text, lang, path) must write an audio file to path"""
+    _backends[name] = (synthesize, suffix)
+
+
+def _cache_path(text, lang, backend):
+    _, suffix = _backends[backend]
+    digest = hashlib.sha256(f"{backend}\0{lang}\0{text}".encode('utf-8')).hexdigest()
+    return os.path.join(AUDIO_CACHE_DIR, digest + suffix)
+
+
+def _enforce_cache_limit():
+    """Delete least recently used audio files until the cache fits AUDIO_CACHE_MAX_BYTES"""
+    with _cache_lock:
+        entries = []
+        for entry in os.scandir(AUDIO_CACHE_DIR):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= AUDIO_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _render(text, lang, backend, path):
+    synthesize, _ = _backends[backend]
+    os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+    # Write to a hidden temporary name (keeping the suffix backends may rely on)
+    # so readers never see a partial file
+    tmp_path = os.path.join(AUDIO_CACHE_DIR, f".{threading.get_ident()}.{os.path.basename(path)}")
     try:
-        # Create text-to-speech object
-        tts = gTTS(text=text, lang=lang, slow=False)
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-            tts.save(fp.name)
-            temp_file = fp.name
-        
-        # Initialize pygame mixer
+        synthesize(text, lang, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Hidden files are not counted by _enforce_cache_limit, so never leave one behind
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _enforce_cache_limit()
+    return path
+
+
+def synthesize_speech(text, lang='en', backend=None):
+    """Return the path of an audio file for text, synthesizing it only on a cache miss"""
+    backend = backend or TTS_BACKEND
+    path = _cache_path(text, lang, backend)
+    if os.path.exists(path):
+        # Touch the file so LRU eviction sees it as recently used
+        os.utime(path)
+        return path
+    return _synthesis.do(path, _render, text, lang, backend, path)
+
+
+def prerender_common_phrases(lang='en', backend=None, phrases=COMMON_PHRASES):
+    """Synthesize templated instructions ahead of time; returns how many are cached"""
+    cached = 0
+    for phrase in phrases:
+        try:
+            synthesize_speech(phrase, lang, backend)
+            cached += 1
+        except Exception as e:
+            print(f"Error pre-rendering '{phrase}': {e}")
+    return cached
+
+
+def _play(path):
+    import pygame
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+
+    # Wait for playback to finish (on the playback thread, not the request thread)
+    while pygame.mixer.music.get_busy():
+        pygame.time.Clock().tick(10)
+
+
+def _playback_worker():
+    global _playback_unavailable
+    # Initialize the mixer once and keep it for the life of the process
+    try:
+        # pygame is only loaded once guidance is actually played
+        import pygame
         pygame.mixer.init()
-        
-        # Load and play the audio
-        pygame.mixer.music.load(temp_file)
-        pygame.mixer.music.play()
-        
-        # Wait for playback to finish
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-        
-        # Clean up
-        pygame.mixer.quit()
-        os.unlink(temp_file)
-        
-        return True
+    except Exception as e:
+        print(f"Error initializing audio playback: {e}")
+        # Stop accepting guidance and discard what was already queued
+        _playback_unavailable = True
+        while True:
+            try:
+                _playback_queue.get_nowait()
+            except queue.Empty:
+                return
+            _playback_queue.task_done()
+    # Audio works, so warm the cache for the common instructions in the background
+    _start_prerender()
+    while True:
+        text, lang, backend = _playback_queue.get()
+        try:
+            _play(synthesize_speech(text, lang, backend))
+        except Exception as e:
+            print(f"Error in text-to-speech: {e}")
+        finally:
+            _playback_queue.task_done()
+
+
+def _start_prerender():
+    global _prerender_started
+    with _playback_lock:
+        if _prerender_started:
+            return
+        _prerender_started = True
+    threading.Thread(target=prerender_common_phrases, name='voice-prerender', daemon=True).start()
+
+
+def _ensure_playback_thread():
+    global _playback_thread
+    with _playback_lock:
+        if _playback_thread is None or not _playback_thread.is_alive():
+            _playback_thread = threading.Thread(target=_playback_worker, name='voice-playback', daemon=True)
+            _playback_thread.start()
+
+
+def text_to_speech(text, lang='en', backend=None):
+    """Queue text for synthesis and playback; returns without waiting for the audio"""
+    if _playback_unavailable:
+        return False
+    try:
+        _ensure_playback_thread()
+        _playback_queue.put_nowait((text, lang, backend))
+        # The worker may have given up on the audio device meanwhile
+        return not _playback_unavailable
+    except queue.Full:
+        print("Error in text-to-speech: playback queue is full")
+        return False
     except Exception as e:
         print(f"Error in text-to-speech: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Voice guidance utilities")
+    parser.add_argument('--prerender', action='store_true', help="synthesize the common instructions into the cache")
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--backend', default=None, help=f"text-to-speech backend (default {TTS_BACKEND})")
+    args = parser.parse_args()
+
+    if not args.prerender:
+        parser.print_help()
+        return
+    cached = prerender_common_phrases(args.lang, args.backend)
+    print(f"Cached {cached} of {len(COMMON_PHRASES)} phrases in {AUDIO_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()